@@ -0,0 +1,47 @@
+import pygame
+from sound_module import EngineAudio, NullAudio
+from pressure_sim.instrumentation import StartupTimer
+
+SAMPLE_RATE = 44100
+
+# Timed from the first import of this module; main.py marks its milestones on it
+startup = StartupTimer()
+
+_mixer = None  # None until first use, then the mixer's (frequency, format, channels), or False without audio
+_engine_audio = None
+
+
+def disable_audio():
+    # Everything audio falls back to silent stand-ins; call before the first sound is used
+    global _mixer
+    _mixer = False
+
+
+def mixer():
+    # The mixer is opened once, on first use. No audio device (or a failing driver) is not an
+    # error: callers get None and run silent.
+    global _mixer
+    if _mixer is None:
+        try:
+            if not pygame.mixer.get_init():
+                pygame.mixer.init(frequency=SAMPLE_RATE)
+            _mixer = pygame.mixer.get_init() or False
+        except pygame.error:
+            _mixer = False
+    return _mixer or None
+
+
+def engine_audio():
+    # The one synthesized engine sound of the process, shared by every engine
+    global _engine_audio
+    if _engine_audio is None:
+        settings = mixer()
+        _engine_audio = NullAudio() if settings is None else EngineAudio(sample_rate=settings[0])
+    return _engine_audio
+
+
+def close_audio():
+    global _engine_audio
+    if _engine_audio is not None:
+        _engine_audio.close()
+        _engine_audio = None
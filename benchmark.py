@@ -0,0 +1,301 @@
+import argparse
+import json
+import math
+import os
+import platform
+import statistics
+import sys
+import time
+
+# Headless and silent: the dummy drivers give real Surfaces without a window or sound device
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+# The gas simulation modules import each other by bare name
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pressure_sim'))
+
+import numpy as np
+import pygame
+from engine_view import EngineView
+from otto_cycle import OttoCycle
+from sound_module import NullAudio
+from sim_clock import SimulationClock
+from ui_module import UI
+from gas import GasChambers, GasSimulation
+from particles import resolve_pairs
+from ui import UIDiagnostics
+
+DEFAULT_BASELINE = 'benchmark_baseline.json'
+PARTICLE_COUNTS = (500, 2000, 8000)
+SCREEN_SIZE = (1400, 800)
+
+
+def measure(func, repeat, number, warmup=1):
+    # Median of `repeat` runs of `number` calls each, in seconds per call
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - start) / number)
+    return statistics.median(samples), min(samples)
+
+
+def result(seconds, best, rate_unit=None, work=1):
+    # `rate` is `work` units per second at the median time, e.g. steps/s or pairs/s
+    entry = {'seconds': seconds, 'best': best}
+    if rate_unit is not None:
+        entry['rate'] = work / seconds
+        entry['unit'] = rate_unit
+    return entry
+
+
+def create_diagnostics(count, seed=0, backend='serial'):
+    gas_sim = GasSimulation(initial_volume=10.0, initial_temperature=300, initial_mass=10.0)
+    ui = UIDiagnostics(gas_sim, pygame.time.Clock(), seed=seed, collision_backend=backend)
+    ui.particles.clear()
+    ui.particles.add(**ui.create_particles(count=count))
+    return gas_sim, ui
+
+
+def bench_diagnostics_update(repeat, counts=PARTICLE_COUNTS, backend='serial'):
+    results = {}
+    for count in counts:
+        gas_sim, ui = create_diagnostics(count, backend=backend)
+        seconds, best = measure(ui.update, repeat, 10)
+        results[f'diagnostics_update[{count}]'] = result(seconds, best, 'steps/s')
+        ui.collisions.close()
+    return results
+
+
+def bench_collision_pairs(repeat, count=2000):
+    # Narrow phase only: every broad-phase candidate pair of a settled box
+    gas_sim, ui = create_diagnostics(count)
+    first, second, _, _ = ui.broad_phase.update(ui.particles, ui.inner_rect)
+    pos = ui.particles.positions
+    vel = ui.particles.velocities
+    snapshot = vel.copy()
+
+    def run():
+        vel[:] = snapshot
+        resolve_pairs(pos, vel, first, second)
+
+    seconds, best = measure(run, repeat, 10)
+    ui.collisions.close()
+    return {f'collision_pairs[{count}]': result(seconds, best, 'pairs/s', len(first))}
+
+
+def bench_release_gas(repeat, counts=(8000, 100000), mass=0.5):
+    results = {}
+    for count in counts:
+        gas_sim, ui = create_diagnostics(count)
+        full = ui.particles.take(np.arange(count))
+
+        def run():
+            ui.particles.clear()
+            ui.particles.add(**{key: value.copy() for key, value in full.items()})
+            ui.particles_moving_outward.clear()
+            gas_sim.mass = 10.0
+            ui.release_gas_via_valve(mass)
+
+        seconds, best = measure(run, repeat, 5)
+        ui.collisions.close()
+        results[f'release_gas_via_valve[{count}]'] = result(seconds, best, 'calls/s')
+    return results
+
+
+def bench_gas_chambers(repeat, count=4096):
+    # Pressure update of `count` chambers, one GasSimulation each versus one GasChambers batch
+    volumes = np.linspace(1.0, 10.0, count)
+    singles = [GasSimulation(initial_volume=volume, initial_temperature=300, initial_mass=10.0) for volume in volumes.tolist()]
+    chambers = GasChambers(volumes, 300, 10.0)
+
+    def run_singles():
+        for gas_sim in singles:
+            gas_sim.update()
+
+    seconds, best = measure(run_singles, repeat, 5)
+    results = {f'gas_update_objects[{count}]': result(seconds, best, 'chambers/s', count)}
+    seconds, best = measure(chambers.update, repeat, 200)
+    results[f'gas_update_batched[{count}]'] = result(seconds, best, 'chambers/s', count)
+    return results
+
+
+def create_engine():
+    width, height = SCREEN_SIZE
+    # Sound is not part of any measurement, so no producer thread can skew timings
+    engine = OttoCycle(crank_radius=100, rod_length=200, piston_width=60, piston_height=100,
+                       crank_center_x=width // 2, crank_center_y=height // 2 + 50, sound=NullAudio())
+    return engine
+
+
+def bench_draw_engine(repeat, screen):
+    engine = create_engine()
+    angular_velocity = 1000 / 60 * 2 * math.pi
+
+    def run():
+        engine.advance(1 / 240, angular_velocity)
+        engine.draw_engine(screen)
+
+    seconds, best = measure(run, repeat, 200)
+    return {'engine_draw': result(seconds, best, 'draws/s')}
+
+
+def bench_draw_slider(repeat, screen):
+    ui = UI()
+    width, height = SCREEN_SIZE
+
+    def run():
+        ui.draw_slider(screen, (width // 2 - 200, height - 150), 400, 10, 10, 1000, 0, 5000, 'RPM', '1000', False)
+
+    seconds, best = measure(run, repeat, 200)
+    return {'ui_draw_slider': result(seconds, best, 'draws/s')}
+
+
+def bench_engine_frame(repeat, screen):
+    # The body of the main.py loop minus event handling, sound and the frame cap
+    width, height = SCREEN_SIZE
+    ui = UI()
+    engine = create_engine()
+    sim_clock = SimulationClock()
+    view = EngineView(screen, engine, ui, [((width // 2 - 200, height - 150), 400, 10, 'RPM'),
+                                           ((width // 2 - 200, height - 80), 400, 10, 'Speed')])
+    rpm = 1000
+    speed_factor = 1.0
+    angular_velocity = (rpm / 60.0) * 2 * math.pi
+
+    def physics_step(dt):
+        engine.advance(dt, angular_velocity)
+        engine.update_pressure()
+
+    def run():
+        view.begin_frame()
+        view.draw_slider(0, 10, rpm, 0, 5000, str(rpm), False)
+        view.draw_slider(1, 10, speed_factor, 0.01, 10.0, '1.0', False)
+        engine.set_render_alpha(sim_clock.advance(1 / 60, angular_velocity, speed_factor, physics_step))
+        view.draw_engine()
+        view.present()
+
+    seconds, best = measure(run, repeat, 60)
+    return {'engine_frame': result(seconds, best, 'frames/s')}
+
+
+def bench_gas_frame(repeat, screen, count=2000):
+    # The body of the pressure_sim/main.py loop
+    gas_sim, ui = create_diagnostics(count)
+
+    def run():
+        gas_sim.update()
+        ui.update()
+        screen.fill((0, 0, 0))
+        ui.draw(screen)
+        pygame.display.flip()
+
+    seconds, best = measure(run, repeat, 20)
+    ui.collisions.close()
+    return {f'gas_frame[{count}]': result(seconds, best, 'frames/s')}
+
+
+def run_benchmarks(repeat=5, backend='serial', only=None):
+    pygame.init()
+    screen = pygame.display.set_mode(SCREEN_SIZE)
+    suites = {
+        'diagnostics_update': lambda: bench_diagnostics_update(repeat, backend=backend),
+        'collision_pairs': lambda: bench_collision_pairs(repeat),
+        'release_gas': lambda: bench_release_gas(repeat),
+        'gas_chambers': lambda: bench_gas_chambers(repeat),
+        'engine_draw': lambda: bench_draw_engine(repeat, screen),
+        'ui_draw_slider': lambda: bench_draw_slider(repeat, screen),
+        'engine_frame': lambda: bench_engine_frame(repeat, screen),
+        'gas_frame': lambda: bench_gas_frame(repeat, screen),
+    }
+    results = {}
+    for name, suite in suites.items():
+        if only and name not in only:
+            continue
+        results.update(suite())
+    pygame.quit()
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'pygame': pygame.version.ver,
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'platform': platform.platform(),
+            'repeat': repeat,
+            'backend': backend,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': results,
+    }
+
+
+def compare(report, baseline, tolerance):
+    # A benchmark regresses when its median time grows by more than `tolerance` (0.1 = 10%)
+    regressions = []
+    rows = []
+    for name, entry in report['results'].items():
+        previous = baseline.get('results', {}).get(name)
+        if previous is None:
+            rows.append((name, entry['seconds'], None, None))
+            continue
+        change = entry['seconds'] / previous['seconds'] - 1
+        rows.append((name, entry['seconds'], previous['seconds'], change))
+        if change > tolerance:
+            regressions.append(name)
+    return rows, regressions
+
+
+def print_rows(rows, stream):
+    for name, seconds, previous, change in rows:
+        if previous is None:
+            print(f"{name:32} {seconds * 1e3:10.3f} ms   (new)", file=stream)
+        else:
+            print(f"{name:32} {seconds * 1e3:10.3f} ms   baseline {previous * 1e3:10.3f} ms   {change:+7.1%}", file=stream)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Headless benchmarks for the engine and gas simulations.")
+    parser.add_argument('--output', default='-', help="JSON file for the results, '-' for stdout")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="stored results to compare against")
+    parser.add_argument('--update-baseline', action='store_true', help="store these results as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=0.1, help="allowed slowdown before failing (0.1 = 10%%)")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--backend', choices=('serial', 'thread', 'process'), default='serial')
+    parser.add_argument('--only', nargs='+', help="run only these suites")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = run_benchmarks(args.repeat, args.backend, args.only)
+
+    text = json.dumps(report, indent=2)
+    if args.output == '-':
+        print(text)
+    else:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+
+    regressions = []
+    if os.path.exists(args.baseline) and not args.update_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        rows, regressions = compare(report, baseline, args.tolerance)
+        print_rows(rows, sys.stderr)
+        if regressions:
+            print(f"Regressed by more than {args.tolerance:.0%}: {', '.join(regressions)}", file=sys.stderr)
+    else:
+        print_rows([(name, entry['seconds'], None, None) for name, entry in report['results'].items()], sys.stderr)
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            f.write(text + '\n')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,44 +1,135 @@
 import pygame
 import math
+from kinematics import crank_kinematics, cylinder_volume, swept_volume, TOP_DEAD_CENTRE_ANGLE
+from otto_solver import CycleParameters, cycle_trace, FOUR_STROKE_CYCLE
+import assets
 
 class Engine:
-    def __init__(self, crank_radius, rod_length, piston_width, piston_height, crank_center_x, crank_center_y):
+    def __init__(self, crank_radius, rod_length, piston_width, piston_height, crank_center_x, crank_center_y, compression_ratio=10.0):
         self.crank_radius = crank_radius
         self.rod_length = rod_length
         self.piston_width = piston_width
         self.piston_height = piston_height
         self.crank_center_x = crank_center_x
         self.crank_center_y = crank_center_y
+        self.compression_ratio = compression_ratio
         self.theta = 0
-    
+        self.angular_velocity = 0.0  # rad/s of the last physics step
+        # Angle through the 720 degree four-stroke cycle, zero at top dead centre before intake
+        self.cycle_angle = (self.theta - TOP_DEAD_CENTRE_ANGLE) % (2 * math.pi)
+        # State before the last step, for drawing in between physics steps
+        self.previous_theta = self.theta
+        self.previous_cycle_angle = self.cycle_angle
+        self.render_alpha = 1.0
+        self.cycle_options = {}  # Overrides for CycleParameters fields, e.g. ignition_angle
+        self._kinematics = None
+        self._state_key = None
+        self._state = None
+        self._sound = None  # EngineAudio or NullAudio; None: the shared engine audio, opened on first use
+
+    @property
+    def sound(self):
+        if self._sound is None:
+            self._sound = assets.engine_audio()
+        return self._sound
+
+    @property
+    def kinematics(self):
+        # Shared lookup table, replaced automatically when the crank or rod geometry changes
+        if self._kinematics is None or self._kinematics.geometry != (self.crank_radius, self.rod_length):
+            self._kinematics = crank_kinematics(self.crank_radius, self.rod_length)
+        return self._kinematics
+
+    def render_angles(self):
+        # Crank and cycle angle interpolated between the last two physics steps
+        step = (self.cycle_angle - self.previous_cycle_angle) % FOUR_STROKE_CYCLE * self.render_alpha
+        return (self.previous_theta + step) % (2 * math.pi), (self.previous_cycle_angle + step) % FOUR_STROKE_CYCLE
+
+    def kinematic_state(self):
+        # Screen positions of the crank pin and piston pin for the drawn angle, computed once per angle
+        theta = self.render_angles()[0]
+        key = (theta, self.crank_radius, self.rod_length, self.crank_center_x, self.crank_center_y)
+        if key != self._state_key:
+            kinematics = self.kinematics
+            pin_x, pin_y = kinematics.crank_pin(theta)
+            piston_y = self.crank_center_y - kinematics.piston_position(theta)
+            self._state = (self.crank_center_x + pin_x, self.crank_center_y + pin_y, piston_y)
+            self._state_key = key
+        return self._state
+
+    def cylinder_volume(self, theta=None):
+        # Bore is the piston width; accepts a scalar or an array of crank angles
+        return cylinder_volume(self.kinematics, self.theta if theta is None else theta, self.piston_width, self.compression_ratio)
+
+    @property
+    def swept_volume(self):
+        # Per cylinder, m^3
+        return swept_volume(self.crank_radius, self.piston_width)
+
+    @property
+    def clearance_volume(self):
+        return self.swept_volume / (self.compression_ratio - 1)
+
+    def cycle_parameters(self):
+        return CycleParameters(self.crank_radius, self.rod_length, self.piston_width, self.compression_ratio, **self.cycle_options)
+
+    def cycle_trace(self):
+        # Cached per parameter set; only a geometry or option change triggers a new solve
+        return cycle_trace(self.cycle_parameters())
+
+    @property
+    def rpm(self):
+        return self.angular_velocity * 60 / (2 * math.pi)
+
+    def advance(self, dt, angular_velocity):
+        # One physics step of dt simulated seconds
+        self.previous_theta = self.theta
+        self.previous_cycle_angle = self.cycle_angle
+        self.angular_velocity = angular_velocity
+        delta = angular_velocity * dt
+        self.theta = (self.theta + delta) % (2 * math.pi)
+        self.cycle_angle = (self.cycle_angle + delta) % FOUR_STROKE_CYCLE
+        self.render_alpha = 1.0
+
     def update_angle(self, angular_velocity, speed_factor):
-        self.theta += angular_velocity * speed_factor / 60
-        if self.theta > 2 * math.pi:
-            self.theta -= 2 * math.pi
+        # Single step covering one 60 FPS frame; SimulationClock drives advance() directly
+        self.advance(speed_factor / 60, angular_velocity)
+
+    def set_render_alpha(self, alpha):
+        self.render_alpha = min(max(alpha, 0.0), 1.0)
 
     def draw_crankshaft(self, screen):
-        crank_x = self.crank_center_x + self.crank_radius * math.cos(self.theta)
-        crank_y = self.crank_center_y + self.crank_radius * math.sin(self.theta)
-        pygame.draw.line(screen, (200, 200, 200), (self.crank_center_x, self.crank_center_y), (crank_x, crank_y), 5)
+        crank_x, crank_y, _ = self.kinematic_state()
+        self._draw_crank(screen, crank_x, crank_y)
         return crank_x, crank_y
 
+    def _draw_crank(self, screen, crank_x, crank_y):
+        return pygame.draw.line(screen, (200, 200, 200), (self.crank_center_x, self.crank_center_y), (crank_x, crank_y), 5)
+
     def draw_piston(self, screen, crank_x, crank_y):
-        dx = crank_x - self.crank_center_x
-        piston_y = self.crank_center_y - math.sqrt(self.rod_length**2 - dx**2)
-        pygame.draw.line(screen, (200, 200, 200), (crank_x, crank_y), (self.crank_center_x, piston_y), 5)
-        pygame.draw.rect(screen, (0, 0, 255), (self.crank_center_x - self.piston_width // 2, piston_y - self.piston_height, self.piston_width, self.piston_height))
+        piston_y = self.kinematic_state()[2]
+        rod_rect = pygame.draw.line(screen, (200, 200, 200), (crank_x, crank_y), (self.crank_center_x, piston_y), 5)
+        piston_rect = pygame.draw.rect(screen, (0, 0, 255), (self.crank_center_x - self.piston_width // 2, piston_y - self.piston_height, self.piston_width, self.piston_height))
+        return rod_rect.union(piston_rect)
 
     def draw_cylinder_head(self, screen):
         head_x = self.crank_center_x - self.piston_width // 2
-        head_y = self.crank_center_y - self.rod_length - self.piston_height - 20
+        head_y = self.crank_center_y - self.kinematics.top_dead_centre - self.piston_height - 20
         pygame.draw.rect(screen, (200, 200, 200), (head_x, head_y, self.piston_width, 20))
         pygame.draw.circle(screen, (0, 0, 0), (head_x + 20, head_y + 10), 10)
         pygame.draw.circle(screen, (0, 0, 0), (head_x + 40, head_y + 10), 10)
 
+    def static_key(self):
+        # Everything the cylinder head drawing depends on; a change means cached static layers are stale
+        return (self.crank_radius, self.rod_length, self.piston_width, self.piston_height, self.crank_center_x, self.crank_center_y)
+
+    def draw_moving_parts(self, screen):
+        # Piston, rod and crank; returns the screen rects they cover
+        crank_x, crank_y, _ = self.kinematic_state()
+        piston_rect = self.draw_piston(screen, crank_x, crank_y)
+        return [piston_rect, self._draw_crank(screen, crank_x, crank_y)]
+
     def draw_engine(self, screen):
-        # Draw the entire engine components
-        crank_x, crank_y = self.draw_crankshaft(screen)
-        self.draw_piston(screen, crank_x, crank_y)
-        self.draw_crankshaft(screen)
-        self.draw_crankshaft(screen)
-        self.draw_cylinder_head(screen)
\ No newline at end of file
+        # Draw the entire engine components; the head goes underneath, as in EngineView's static layer
+        self.draw_cylinder_head(screen)
+        self.draw_moving_parts(screen)
@@ -0,0 +1,101 @@
+import pygame
+
+
+class EngineView:
+    # Dirty-rectangle renderer for the engine window. The background, cylinder heads and
+    # slider tracks/labels are drawn once into a cached surface; each frame only the areas
+    # covered by last frame's moving parts are restored from it, the moving parts are drawn
+    # again and just those rects are pushed with display.update. Panels (e.g. PVDiagram) add
+    # their fixed parts to the cached surface and redraw their contents every frame.
+    def __init__(self, screen, engine, ui, sliders, background=(255, 255, 255), panels=()):
+        self.screen = screen
+        self.engine = engine
+        self.ui = ui
+        self.sliders = sliders  # [(slider_pos, slider_width, slider_height, label)]
+        self.background = background
+        self.panels = list(panels)
+        self.static = None
+        self._static_key = None
+        self._full_redraw = True
+        self._previous = []
+        self._dirty = []
+
+    def invalidate(self):
+        # Next frame repaints and presents the whole window, e.g. after it was exposed
+        self._full_redraw = True
+
+    def static_key(self):
+        return (self.screen.get_size(), self.engine.static_key(), tuple(self.sliders), self.background,
+                tuple(panel.static_key() for panel in self.panels))
+
+    def build_static(self):
+        static = pygame.Surface(self.screen.get_size()).convert()
+        static.fill(self.background)
+        self.engine.draw_cylinder_head(static)
+        for slider_pos, slider_width, slider_height, label in self.sliders:
+            self.ui.draw_slider_track(static, slider_pos, slider_width, slider_height, label)
+        for panel in self.panels:
+            panel.draw_static(static)
+        return static
+
+    def begin_frame(self):
+        key = self.static_key()
+        if key != self._static_key:
+            self.static = self.build_static()
+            self._static_key = key
+            self._full_redraw = True
+        if self._full_redraw:
+            self.screen.blit(self.static, (0, 0))
+        else:
+            for rect in self._previous:
+                self.screen.blit(self.static, rect, rect)
+        self._dirty = []
+
+    def mark(self, rects):
+        self._dirty.extend(rects)
+
+    def draw_slider(self, index, indicator_radius, value, min_value, max_value, input_value, input_active):
+        # Same return value as UI.draw_slider
+        slider_pos, slider_width, slider_height, _ = self.sliders[index]
+        self.mark(self.ui.draw_slider_value(self.screen, slider_pos, slider_width, slider_height, indicator_radius,
+                                            value, min_value, max_value, input_value, input_active))
+        return self.ui.slider_rects(slider_pos, slider_width, slider_height)
+
+    def draw_engine(self):
+        self.mark(self.engine.draw_moving_parts(self.screen))
+
+    def draw_panels(self):
+        for panel in self.panels:
+            self.mark(panel.draw(self.screen))
+
+    def present(self):
+        if self._full_redraw:
+            pygame.display.flip()
+            self._full_redraw = False
+        else:
+            # Last frame's rects are where stale pixels were just painted over
+            pygame.display.update(self._previous + self._dirty)
+        self._previous = self._dirty
+
+
+class EngineSnapshot:
+    # Crank angles and cylinder pressure after one physics step. The simulation thread
+    # captures the engine it steps; the render thread applies the snapshot to the engine
+    # it draws, so drawing never reads state that is being advanced.
+    FIELDS = ('theta', 'cycle_angle', 'previous_theta', 'previous_cycle_angle', 'render_alpha', 'angular_velocity',
+              'pressure', 'temperature')
+
+    def __init__(self):
+        for name in self.FIELDS:
+            setattr(self, name, 0.0)
+        self.step = 0
+
+    def capture(self, engine, step=0):
+        # Pressure arrays are replaced, not modified, by every step, so keeping a reference is safe
+        for name in self.FIELDS:
+            setattr(self, name, getattr(engine, name))
+        self.step = step
+
+    def apply(self, engine):
+        for name in self.FIELDS:
+            setattr(engine, name, getattr(self, name))
@@ -0,0 +1,94 @@
+import math
+from functools import lru_cache
+import numpy as np
+
+METRES_PER_PIXEL = 0.001  # Engine geometry is drawn at 1 px = 1 mm
+TOP_DEAD_CENTRE_ANGLE = 3 * math.pi / 2  # Crank pin pointing straight up the screen
+
+
+class CrankKinematics:
+    # Crank-slider tables over one revolution. The cylinder axis points up the screen from
+    # the crank centre; positions are offsets from the crank centre in pixels and the
+    # piston position is the height of the piston pin above the crank centre.
+    # Velocity and acceleration are per radian of crank angle (multiply by omega, omega^2).
+    def __init__(self, crank_radius, rod_length, resolution=3600):
+        if rod_length <= crank_radius:
+            raise ValueError("rod_length must be longer than crank_radius")
+        self.crank_radius = crank_radius
+        self.rod_length = rod_length
+        self.resolution = resolution
+        self.step = 2 * math.pi / resolution
+
+        # One extra sample at 2*pi so interpolation never wraps inside a cell
+        theta = np.linspace(0.0, 2 * math.pi, resolution + 1)
+        cos_t = np.cos(theta)
+        sin_t = np.sin(theta)
+        r = crank_radius
+        rod_reach = np.sqrt(rod_length**2 - (r * cos_t) ** 2)
+        sin_cos = r**2 * sin_t * cos_t
+
+        self.pin_x = r * cos_t
+        self.pin_y = r * sin_t
+        self.position = rod_reach - r * sin_t
+        self.velocity = sin_cos / rod_reach - r * cos_t
+        self.acceleration = r**2 * np.cos(2 * theta) / rod_reach - sin_cos**2 / rod_reach**3 + r * sin_t
+
+        # Plain lists make the scalar path free of NumPy per-call overhead
+        self._columns = {name: getattr(self, name).tolist()
+                         for name in ('pin_x', 'pin_y', 'position', 'velocity', 'acceleration')}
+
+    @property
+    def geometry(self):
+        return self.crank_radius, self.rod_length
+
+    @property
+    def top_dead_centre(self):
+        return self.rod_length + self.crank_radius
+
+    @property
+    def bottom_dead_centre(self):
+        return self.rod_length - self.crank_radius
+
+    def _lookup(self, name, theta):
+        if isinstance(theta, np.ndarray):
+            scaled = np.mod(theta, 2 * math.pi) / self.step
+            index = np.minimum(scaled.astype(np.intp), self.resolution - 1)
+            frac = scaled - index
+            table = getattr(self, name)
+            return table[index] + (table[index + 1] - table[index]) * frac
+
+        scaled = (theta % (2 * math.pi)) / self.step
+        index = min(int(scaled), self.resolution - 1)
+        frac = scaled - index
+        table = self._columns[name]
+        return table[index] + (table[index + 1] - table[index]) * frac
+
+    def crank_pin(self, theta):
+        return self._lookup('pin_x', theta), self._lookup('pin_y', theta)
+
+    def piston_position(self, theta):
+        return self._lookup('position', theta)
+
+    def piston_velocity(self, theta, angular_velocity=1.0):
+        return self._lookup('velocity', theta) * angular_velocity
+
+    def piston_acceleration(self, theta, angular_velocity=1.0):
+        return self._lookup('acceleration', theta) * angular_velocity**2
+
+
+@lru_cache(maxsize=32)
+def crank_kinematics(crank_radius, rod_length, resolution=3600):
+    # Engines with the same geometry share one table
+    return CrankKinematics(crank_radius, rod_length, resolution)
+
+
+def swept_volume(crank_radius, bore):
+    # Displacement of one cylinder in m^3, from bottom to top dead centre
+    return math.pi / 4 * (bore * METRES_PER_PIXEL) ** 2 * 2 * crank_radius * METRES_PER_PIXEL
+
+
+def cylinder_volume(kinematics, theta, bore, compression_ratio):
+    # Gas volume above the piston in m^3; bore is in pixels like the rest of the geometry
+    area = math.pi / 4 * (bore * METRES_PER_PIXEL) ** 2
+    clearance = swept_volume(kinematics.crank_radius, bore) / (compression_ratio - 1)
+    return clearance + area * (kinematics.top_dead_centre - kinematics.piston_position(theta)) * METRES_PER_PIXEL
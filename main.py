@@ -1,21 +1,79 @@
+import argparse
+import copy
+import sys
+import time
 import pygame
 import math
 from engine import Engine
 from ui_module import UI
 from otto_cycle import OttoCycle
-
-# Initialize Pygame
-pygame.init()
+from multi_cylinder import LAYOUTS, MultiCylinderEngine
+import assets
+from sim_clock import SimulationClock
+from engine_view import EngineSnapshot, EngineView
+from pv_diagram import PVDiagram
+from pressure_sim.instrumentation import FrameProfiler
+from pressure_sim.recorder import TraceReader, TraceWriter, engine_fields
+from pressure_sim.text_cache import text_cache
+from pressure_sim.snapshot import SimulationWorker, SnapshotBuffer
+
+parser = argparse.ArgumentParser(description="Otto cycle engine simulator")
+parser.add_argument('--layout', choices=sorted(LAYOUTS), default='single', help="cylinder arrangement to simulate")
+parser.add_argument('--phases', action='store_true', help="time each frame phase and show the overlay (F3 toggles it)")
+parser.add_argument('--phase-dump', metavar='PATH', help="append phase statistics to PATH as JSON lines")
+parser.add_argument('--record', metavar='PATH', help="write every physics step to a binary trace")
+parser.add_argument('--replay', metavar='PATH', help="play back a trace: space pauses, arrows seek a second, page keys a tenth")
+parser.add_argument('--no-audio', action='store_true', help="run silent without opening an audio device")
+parser.add_argument('--startup-time', action='store_true', help="print how long start-up took, up to the first frame")
+parser.add_argument('--threaded', action='store_true', help="step the physics on its own thread; the window draws the latest snapshot")
+args = parser.parse_args()
+if args.threaded and args.replay is not None:
+    parser.error("--threaded cannot be combined with --replay")
+replay = TraceReader(args.replay) if args.replay is not None else None
+if replay is not None:
+    args.layout = replay.metadata.get('layout', args.layout)  # Replay with the engine the trace was recorded on
+profiler = FrameProfiler(enabled=args.phases or args.phase_dump is not None, dump_path=args.phase_dump)
+profiler.show_overlay = args.phases
+if args.no_audio:
+    assets.disable_audio()
+
+# Initialize Pygame: only the display here; fonts and the mixer open when first used
+pygame.display.init()
 
 # Set up display
 width, height = 1400, 800
 screen = pygame.display.set_mode((width, height))
+assets.startup.mark('window')
 clock = pygame.time.Clock()
+sim_clock = SimulationClock()
 
 # Initialize UI and Engine
 ui = UI()
-engine = OttoCycle(crank_radius=100, rod_length=200, piston_width=60, piston_height=100, crank_center_x=width // 2, crank_center_y=height // 2 - 50)
-sound = EngineSound()
+if args.layout == 'single':
+    engine = OttoCycle(crank_radius=100, rod_length=200, piston_width=60, piston_height=100, crank_center_x=width // 2, crank_center_y=height // 2 + 50)
+else:
+    # Smaller geometry so every cylinder fits side by side in the window
+    engine = MultiCylinderEngine(args.layout, crank_radius=40, rod_length=80, piston_width=30, piston_height=40, crank_center_x=width // 2, crank_center_y=height // 2 + 50)
+assets.startup.mark('engine')
+
+# Static parts are cached by the view; only moving parts are redrawn and pushed each frame
+rpm_slider = ((width // 2 - 200, height - 150), 400, 10, 'RPM')
+speed_slider = ((width // 2 - 200, height - 80), 400, 10, 'Speed')
+# Threaded, the worker steps `engine` and the view draws a copy that snapshots are applied to
+render_engine = copy.copy(engine) if args.threaded else engine
+# Fed by every physics step of `engine`, on the worker thread when threaded; F4 hides it
+pv_diagram = PVDiagram(engine, (width - 380, 20, 360, 260), ui.font)
+view = EngineView(screen, render_engine, ui, [rpm_slider, speed_slider], panels=[pv_diagram])
+
+# Recording appends one row per physics step; replay drives the engine from a trace instead of the clock
+cylinders = getattr(engine, 'cylinders', 1)
+trace = None
+trace_time = 0.0
+if args.record is not None:
+    trace = TraceWriter(args.record, engine_fields(cylinders), rows=4096, metadata={'source': 'engine', 'layout': args.layout})
+replay_time = 0.0
+replay_paused = False
+replay_step = -1
 
 # Main loop
 running = True
@@ -25,58 +83,107 @@ rpm_input_value = str(rpm)
 rpm_previous_value = rpm_input_value
 
 speed_factor = 1.0
+max_speed_factor = 10.0  # Above 1.0 fast-forwards; the clock adds sub-steps to keep accuracy
 speed_input_active = False
 speed_input_value = str(speed_factor)
 speed_previous_value = speed_input_value
 
+def physics_step(dt):
+    global trace_time
+    engine.advance(dt, angular_velocity)
+    engine.update_pressure()
+    pv_diagram.record()
+    if trace is not None:
+        trace_time += dt
+        sound = getattr(engine, 'sound', None)
+        trace.append((trace.steps, trace_time, engine.theta, engine.cycle_angle, engine.rpm, engine.pressure,
+                      sound.phase if sound is not None else 0.0))
+
+def threaded_step():
+    # One pass of the fixed-step clock over the real time since the previous pass
+    global last_step_time
+    now = time.perf_counter()
+    alpha = sim_clock.advance(now - last_step_time, angular_velocity, speed_factor, physics_step)
+    engine.set_render_alpha(alpha)
+    last_step_time = now
+
+worker = None
+if args.threaded:
+    angular_velocity = (rpm / 60.0) * 2 * math.pi
+    last_step_time = time.perf_counter()
+    snapshots = SnapshotBuffer(EngineSnapshot)
+    worker = SimulationWorker(threaded_step, lambda snapshot: snapshot.capture(engine, worker.steps), snapshots, rate=240)
+    worker.start()
+
 while running:
-    screen.fill((255, 255, 255))
-    
-    # Draw RPM and Speed sliders to get the clickable rects
-    rpm_text_box_rect, rpm_clickable_rect = ui.draw_slider(screen, (width // 2 - 200, height - 150), 400, 10, 10, rpm, 0, 5000, 'RPM', rpm_input_value, rpm_input_active)
-    speed_text_box_rect, speed_clickable_rect = ui.draw_slider(screen, (width // 2 - 200, height - 80), 400, 10, 10, speed_factor, 0.01, 1.0, 'Speed', speed_input_value, speed_input_active)
-
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
-        elif event.type == pygame.MOUSEBUTTONDOWN:
-            # Handle clicks on text boxes
-            rpm_input_active, speed_input_active, rpm_input_value, speed_input_value = ui.handle_mouse_click(
-                event, rpm_text_box_rect, speed_text_box_rect, rpm_input_value, speed_input_value, rpm_input_active, speed_input_active, rpm_previous_value, speed_previous_value
-            )
-
-        elif event.type == pygame.KEYDOWN:
-            # Handle text input in the text boxes
-            if rpm_input_active:
-                rpm_input_active, rpm_input_value = ui.handle_text_input(event, rpm_input_active, rpm_input_value)
-                if not rpm_input_active:
-                    try:
-                        rpm = int(rpm_input_value)
-                    except ValueError:
-                        rpm = 0
-                    rpm_previous_value = rpm_input_value
-
-            if speed_input_active:
-                speed_input_active, speed_input_value = ui.handle_text_input(event, speed_input_active, speed_input_value)
-                if not speed_input_active:
-                    try:
-                        speed_factor = float(speed_input_value)
-                    except ValueError:
-                        speed_factor = 0.01
-                    speed_previous_value = speed_input_value
-
-        # Handle slider movement and update text accordingly
-        new_rpm, new_speed_factor = ui.handle_slider_movement(event, rpm_clickable_rect, speed_clickable_rect, rpm, speed_factor)
-
-        if new_rpm != rpm:
-            rpm = new_rpm
-            rpm_input_value = str(int(rpm))
-            rpm_previous_value = rpm_input_value  # Update previous value when slider is moved
-
-        if new_speed_factor != speed_factor:
-            speed_factor = new_speed_factor
-            speed_input_value = f"{speed_factor:.2f}"
-            speed_previous_value = speed_input_value  # Update previous value when slider is moved
+    with profiler.scope('ui'):
+        view.begin_frame()
+
+        # Draw RPM and Speed sliders to get the clickable rects
+        rpm_text_box_rect, rpm_clickable_rect = view.draw_slider(0, 10, rpm, 0, 5000, rpm_input_value, rpm_input_active)
+        speed_text_box_rect, speed_clickable_rect = view.draw_slider(1, 10, speed_factor, 0.01, max_speed_factor, speed_input_value, speed_input_active)
+
+    with profiler.scope('events'):
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                profiler.show_overlay = not profiler.show_overlay
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F4:
+                pv_diagram.visible = not pv_diagram.visible
+            elif (event.type == pygame.KEYDOWN and replay is not None and not (rpm_input_active or speed_input_active)
+                  and event.key in (pygame.K_SPACE, pygame.K_LEFT, pygame.K_RIGHT, pygame.K_PAGEUP, pygame.K_PAGEDOWN, pygame.K_HOME)):
+                replay_duration = float(replay.step(len(replay) - 1)['time'])
+                if event.key == pygame.K_SPACE:
+                    replay_paused = not replay_paused
+                elif event.key == pygame.K_HOME:
+                    replay_time = 0.0
+                else:
+                    seek = 1.0 if event.key in (pygame.K_LEFT, pygame.K_RIGHT) else replay_duration / 10
+                    replay_time += seek if event.key in (pygame.K_RIGHT, pygame.K_PAGEDOWN) else -seek
+                replay_time = min(max(replay_time, 0.0), replay_duration)
+                replay_step = -1  # Resync the sound phase after a jump
+                pv_diagram.reset()
+            elif event.type == pygame.WINDOWEXPOSED:
+                view.invalidate()
+            elif event.type == pygame.MOUSEBUTTONDOWN:
+                # Handle clicks on text boxes
+                rpm_input_active, speed_input_active, rpm_input_value, speed_input_value = ui.handle_mouse_click(
+                    event, rpm_text_box_rect, speed_text_box_rect, rpm_input_value, speed_input_value, rpm_input_active, speed_input_active, rpm_previous_value, speed_previous_value
+                )
+
+            elif event.type == pygame.KEYDOWN:
+                # Handle text input in the text boxes
+                if rpm_input_active:
+                    rpm_input_active, rpm_input_value = ui.handle_text_input(event, rpm_input_active, rpm_input_value)
+                    if not rpm_input_active:
+                        try:
+                            rpm = int(rpm_input_value)
+                        except ValueError:
+                            rpm = 0
+                        rpm_previous_value = rpm_input_value
+
+                if speed_input_active:
+                    speed_input_active, speed_input_value = ui.handle_text_input(event, speed_input_active, speed_input_value)
+                    if not speed_input_active:
+                        try:
+                            speed_factor = float(speed_input_value)
+                        except ValueError:
+                            speed_factor = 0.01
+                        speed_previous_value = speed_input_value
+
+            # Handle slider movement and update text accordingly
+            new_rpm, new_speed_factor = ui.handle_slider_movement(event, rpm_clickable_rect, speed_clickable_rect, rpm, speed_factor, speed_range=(0.01, max_speed_factor))
+
+            if new_rpm != rpm:
+                rpm = new_rpm
+                rpm_input_value = str(int(rpm))
+                rpm_previous_value = rpm_input_value  # Update previous value when slider is moved
+
+            if new_speed_factor != speed_factor:
+                speed_factor = new_speed_factor
+                speed_input_value = f"{speed_factor:.2f}"
+                speed_previous_value = speed_input_value  # Update previous value when slider is moved
 
     # Revert text if input box is deactivated
     rpm_input_value, speed_input_value = ui.revert_text_if_inactive(
@@ -85,14 +192,62 @@ while running:
 
     # Calculate angular velocity (rad/s)
     angular_velocity = (rpm / 60.0) * 2 * math.pi  # Convert RPM to radians per second
-    engine.update_angle(angular_velocity, speed_factor)
-    engine.update_pressure()
-    engine.update_sound()
+
+    # Fixed-size physics steps for the real time that passed, then draw between the last two states
+    with profiler.scope('physics'):
+        if worker is not None:
+            worker.check()
+            snapshot = snapshots.acquire()
+            if snapshot is not None:
+                snapshot.apply(render_engine)
+        elif replay is None:
+            alpha = sim_clock.advance(clock.get_time() / 1000.0, angular_velocity, speed_factor, physics_step)
+            engine.set_render_alpha(alpha)
+        elif len(replay):
+            if not replay_paused:
+                replay_time += min(clock.get_time() / 1000.0, sim_clock.max_frame_time) * speed_factor
+            step = replay.find('time', replay_time)
+            record = replay.step(step)
+            replay_time = min(replay_time, float(record['time']))
+            engine.theta = float(record['theta'])
+            engine.cycle_angle = float(record['cycle_angle'])
+            engine.advance(0.0, float(record['rpm']) * 2 * math.pi / 60)  # A zero step refreshes the derived state
+            engine.update_pressure()
+            engine.pressure = record['pressure'].copy() if cylinders > 1 else float(record['pressure'][0])
+            if step != replay_step:
+                pv_diagram.record()
+            sound = getattr(engine, 'sound', None)
+            if sound is not None and replay_step < 0:
+                sound.phase = float(record['sound_phase'])
+            replay_step = step
+            rpm = int(record['rpm'])
+            rpm_input_value = rpm_previous_value = str(rpm)
+    with profiler.scope('sound'):
+        render_engine.update_sound(speed_factor)
 
     # Draw engine components
-    engine.draw_engine(screen)
-    
-    pygame.display.flip()
+    with profiler.scope('engine'):
+        view.draw_engine()
+        view.draw_panels()
+    if replay is not None and len(replay):
+        status = f"replay {replay_time:.2f} s" + (" (paused)" if replay_paused else "")
+        view.mark([screen.blit(text_cache.render(ui.font, status, True, ui.black), (10, height - 40))])
+    view.mark(profiler.draw_overlay(screen, ui.font, (10, 10), ui.black))
+
+    with profiler.scope('flip'):
+        view.present()
+    profiler.end_frame()
+    if args.startup_time and 'first_frame' not in assets.startup.marks:
+        assets.startup.mark('first_frame')
+        print(f"startup: {assets.startup.report()}", file=sys.stderr)
     clock.tick(60)
 
+if worker is not None:
+    worker.stop()
+if args.phase_dump is not None:
+    profiler.dump(args.phase_dump)
+if trace is not None:
+    trace.close()
+
+assets.close_audio()
 pygame.quit()
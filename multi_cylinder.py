@@ -0,0 +1,135 @@
+import math
+import numpy as np
+import pygame
+from engine import Engine
+from kinematics import TOP_DEAD_CENTRE_ANGLE
+from otto_solver import FOUR_STROKE_CYCLE
+
+# Cylinders are numbered from 1. In V layouts odd cylinders sit on the left bank and even
+# cylinders on the right, and each consecutive odd/even pair shares a crank throw. A shared pin
+# ties the right cylinder's timing to the left one's, so in V layouts the firing order places
+# the left bank and MultiCylinderEngine.firing_order is the order that results.
+LAYOUTS = {
+    'single': {'cylinders': 1, 'firing_order': (1,), 'bank_angle': 0},
+    'inline-4': {'cylinders': 4, 'firing_order': (1, 3, 4, 2), 'bank_angle': 0},
+    'V6': {'cylinders': 6, 'firing_order': (1, 2, 3, 4, 5, 6), 'bank_angle': 60},
+    'V8': {'cylinders': 8, 'firing_order': (1, 2, 6, 3, 4, 5, 7, 8), 'bank_angle': 90},
+}
+
+
+class MultiCylinderEngine(Engine):
+    # N cylinders sharing one crank geometry. Per-cylinder crank angle, volume and pressure
+    # live in arrays and are advanced together; `theta` is cylinder 1's crank angle.
+    def __init__(self, layout, crank_radius, rod_length, piston_width, piston_height, crank_center_x, crank_center_y,
+                 compression_ratio=10.0, spacing=None, sound=None):
+        super().__init__(crank_radius, rod_length, piston_width, piston_height, crank_center_x, crank_center_y, compression_ratio)
+        if layout not in LAYOUTS:
+            raise ValueError(f"Unknown engine layout: {layout}")
+        spec = LAYOUTS[layout]
+        self.layout = layout
+        self.cylinders = spec['cylinders']
+        self.firing_order = spec['firing_order']
+        self.pressure = np.zeros(self.cylinders)
+        self.temperature = np.zeros(self.cylinders)
+        self._sound = sound  # Fed every cylinder's phase
+
+        # Cylinder n fires (position in firing order) / N of a four-stroke cycle after cylinder 1
+        number = np.arange(1, self.cylinders + 1)
+        fire_slot = np.array([self.firing_order.index(n) for n in number])
+        self.phase_offsets = fire_slot * FOUR_STROKE_CYCLE / self.cylinders
+
+        bank = math.radians(spec['bank_angle']) / 2
+        if spec['bank_angle']:
+            self.tilt = np.where(number % 2 == 1, -bank, bank)
+            throw = (number - 1) // 2
+            # The right cylinder meets its throw's pin the bank angle of rotation after the left
+            # one does, or a revolution later if that slot is taken (a four-stroke fires on either)
+            for second in range(1, self.cylinders, 2):
+                offset = self.phase_offsets[second - 1] + 2 * bank
+                taken = self.phase_offsets[np.r_[0:self.cylinders:2, 1:second:2]]  # Left bank and right cylinders placed so far
+                gap = np.abs(np.mod(taken - offset + FOUR_STROKE_CYCLE / 2, FOUR_STROKE_CYCLE) - FOUR_STROKE_CYCLE / 2)
+                if gap.min() < 1e-9:
+                    offset += 2 * math.pi
+                self.phase_offsets[second] = offset % FOUR_STROKE_CYCLE
+            self.firing_order = tuple(int(n) for n in number[np.argsort(self.phase_offsets, kind='stable')])
+        else:
+            self.tilt = np.zeros(self.cylinders)
+            throw = number - 1
+        throws = throw.max() + 1
+        if spacing is None:
+            # Far enough apart that neighbouring throws (and tilted banks) do not overlap
+            reach = rod_length + crank_radius + piston_height + 20
+            spacing = max(2 * (crank_radius + piston_width), 2 * reach * math.sin(bank) + piston_width)
+        self.throw = throw
+        self._first_on_throw = np.searchsorted(throw, throw)  # Cylinder whose pin each rod is drawn from
+        self.centre_x = crank_center_x + (throw - (throws - 1) / 2) * spacing
+        self.centre_y = np.full(self.cylinders, float(crank_center_y))
+        self._cos_tilt = np.cos(self.tilt)
+        self._sin_tilt = np.sin(self.tilt)
+
+        self.update_cylinders()
+
+    def advance(self, dt, angular_velocity):
+        super().advance(dt, angular_velocity)
+        self.update_cylinders()
+
+    def cylinder_angles(self, cycle_angle):
+        cycle_angles = np.mod(cycle_angle - self.phase_offsets, FOUR_STROKE_CYCLE)
+        return cycle_angles, np.mod(cycle_angles + TOP_DEAD_CENTRE_ANGLE, 2 * math.pi)
+
+    def update_cylinders(self):
+        # One vectorized pass over every cylinder
+        self.cycle_angles, self.crank_angles = self.cylinder_angles(self.cycle_angle)
+        self.piston_positions = self.kinematics.piston_position(self.crank_angles)
+        self.volumes = self.cylinder_volume(self.crank_angles)
+
+    def update_pressure(self):
+        # Every cylinder reads the same cached cycle trace at its own cycle angle
+        trace = self.cycle_trace()
+        self.pressure = trace.pressure_at(self.cycle_angles)
+        self.temperature = trace.temperature_at(self.cycle_angles)
+
+    def update_sound(self, speed_factor=1.0):
+        self.sound.set_state(self.rpm * speed_factor, self.cycle_trace(), self.phase_offsets)
+        self.sound.pump()
+
+    def _to_screen(self, local_x, local_y):
+        # Rotate cylinder-frame offsets (axis pointing up the screen) by each cylinder's bank tilt
+        x = self.centre_x[:, None] + local_x * self._cos_tilt[:, None] - local_y * self._sin_tilt[:, None]
+        y = self.centre_y[:, None] + local_x * self._sin_tilt[:, None] + local_y * self._cos_tilt[:, None]
+        return np.stack((x, y), axis=-1)
+
+    def static_key(self):
+        return super().static_key() + (self.layout,)
+
+    def draw_cylinder_head(self, screen):
+        half_width = self.piston_width / 2
+        head = -(self.kinematics.top_dead_centre + self.piston_height)
+        heads = self._to_screen(np.array([-half_width, half_width, half_width, -half_width]),
+                                np.tile([head - 20, head - 20, head, head], (self.cylinders, 1)))
+        for cylinder in range(self.cylinders):
+            pygame.draw.polygon(screen, (200, 200, 200), heads[cylinder])
+
+    def draw_moving_parts(self, screen):
+        kinematics = self.kinematics
+        crank_angles = self.cylinder_angles(self.render_angles()[1])[1]
+        pin_x, pin_y = kinematics.crank_pin(crank_angles)
+        piston_positions = kinematics.piston_position(crank_angles)
+        half_width = self.piston_width / 2
+        top = -(piston_positions + self.piston_height)
+        pin = -piston_positions
+
+        zeros = np.zeros(self.cylinders)
+        crank_pins = self._to_screen(pin_x[:, None], pin_y[:, None])[:, 0][self._first_on_throw]
+        piston_pins = self._to_screen(zeros[:, None], pin[:, None])[:, 0]
+        pistons = self._to_screen(np.array([-half_width, half_width, half_width, -half_width]),
+                                  np.stack((top, top, pin, pin), axis=1))
+        centres = np.stack((self.centre_x, self.centre_y), axis=1)
+
+        rects = []
+        for cylinder in range(self.cylinders):
+            rects.append(pygame.draw.line(screen, (200, 200, 200), crank_pins[cylinder], piston_pins[cylinder], 5))
+            rects.append(pygame.draw.polygon(screen, (0, 0, 255), pistons[cylinder]))
+            if self._first_on_throw[cylinder] == cylinder:
+                rects.append(pygame.draw.line(screen, (200, 200, 200), centres[cylinder], crank_pins[cylinder], 5))
+        return rects
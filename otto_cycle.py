@@ -1,32 +1,20 @@
 from engine import Engine
-from sound_module import EngineSound
-import math
 
 class OttoCycle(Engine):
-    def __init__(self, crank_radius, rod_length, piston_width, piston_height, crank_center_x, crank_center_y):
-        super().__init__(crank_radius, rod_length, piston_width, piston_height, crank_center_x, crank_center_y)
-        self.pressure = 1.0
-        self.combustion_pressure = 5.0
-        self.sound = EngineSound()
+    def __init__(self, crank_radius, rod_length, piston_width, piston_height, crank_center_x, crank_center_y, compression_ratio=10.0, sound=None, **cycle_options):
+        super().__init__(crank_radius, rod_length, piston_width, piston_height, crank_center_x, crank_center_y, compression_ratio)
+        self.cycle_options = cycle_options
+        self._sound = sound
+        self.update_pressure()
 
     def update_pressure(self):
-        if 0 < self.theta < math.pi / 2:  # Intake phase
-            self.pressure += 0.01
-        elif math.pi / 2 < self.theta < math.pi:  # Compression phase
-            self.pressure += 0.02
-        elif math.pi < self.theta < 3 * math.pi / 2:  # Ignition phase
-            self.pressure -= 0.02
-        elif 3 * math.pi / 2 < self.theta < 2 * math.pi:  # Exhaust phase
-            self.pressure -= 0.01
+        # Cylinder pressure (Pa) and temperature (K) read from the cached 720 degree trace
+        trace = self.cycle_trace()
+        self.pressure = trace.pressure_at(self.cycle_angle)
+        self.temperature = trace.temperature_at(self.cycle_angle)
 
-        self.pressure = max(1.0, min(self.combustion_pressure, self.pressure))
-
-    def update_sound(self):
-        if 0 < self.theta < math.pi / 2:  # Intake phase
-            self.sound.play_cycle('intake')
-        elif math.pi / 2 < self.theta < math.pi:  # Compression phase
-            self.sound.play_cycle('compression')
-        elif math.pi < self.theta < 3 * math.pi / 2:  # Ignition phase
-            self.sound.play_cycle('ignition')
-        elif 3 * math.pi / 2 < self.theta < 2 * math.pi:  # Exhaust phase
-            self.sound.play_cycle('exhaust')
+    def update_sound(self, speed_factor=1.0):
+        # The audio thread synthesizes from the trace; here we only hand over state and queue blocks.
+        # Slow motion and fast-forward shift the pitch with the apparent crank speed.
+        self.sound.set_state(self.rpm * speed_factor, self.cycle_trace())
+        self.sound.pump()
@@ -0,0 +1,104 @@
+import math
+from collections import namedtuple
+from functools import lru_cache
+import numpy as np
+from kinematics import crank_kinematics, cylinder_volume, TOP_DEAD_CENTRE_ANGLE
+from pressure_sim.gas import GasSimulation, MOLAR_MASS_AIR
+
+FOUR_STROKE_CYCLE = 4 * math.pi
+
+# Angles are cycle degrees after top dead centre at the start of the intake stroke:
+# intake 0-180, compression 180-360, expansion 360-540, exhaust 540-720.
+CycleParameters = namedtuple('CycleParameters', [
+    'crank_radius', 'rod_length', 'bore', 'compression_ratio',
+    'intake_pressure', 'intake_temperature', 'exhaust_pressure',
+    'compression_exponent', 'expansion_exponent',
+    'air_fuel_ratio', 'fuel_heating_value', 'combustion_efficiency',
+    'ignition_angle', 'burn_duration', 'wiebe_a', 'wiebe_m',
+    'steps_per_degree',
+], defaults=(
+    101325.0, 300.0, 105000.0,
+    1.32, 1.25,
+    14.7, 44e6, 0.9,
+    350.0, 50.0, 5.0, 2.0,
+    2,
+))
+
+
+class CycleTrace:
+    # Pressure, temperature and volume over one 720 degree cycle, sampled on a uniform grid
+    def __init__(self, parameters, angle, volume, pressure, temperature, burned_fraction):
+        self.parameters = parameters
+        self.angle = angle
+        self.volume = volume
+        self.pressure = pressure
+        self.temperature = temperature
+        self.burned_fraction = burned_fraction
+        self.samples = len(angle) - 1
+        self.step = FOUR_STROKE_CYCLE / self.samples
+        self._pressure = pressure.tolist()
+        self._temperature = temperature.tolist()
+
+    def _lookup(self, table, values, cycle_angle):
+        # cycle_angle in radians; scalars use the list copy to avoid NumPy call overhead
+        if isinstance(cycle_angle, np.ndarray):
+            scaled = np.mod(cycle_angle, FOUR_STROKE_CYCLE) / self.step
+            index = np.minimum(scaled.astype(np.intp), self.samples - 1)
+            return table[index] + (table[index + 1] - table[index]) * (scaled - index)
+        scaled = (cycle_angle % FOUR_STROKE_CYCLE) / self.step
+        index = min(int(scaled), self.samples - 1)
+        return values[index] + (values[index + 1] - values[index]) * (scaled - index)
+
+    def pressure_at(self, cycle_angle):
+        return self._lookup(self.pressure, self._pressure, cycle_angle)
+
+    def temperature_at(self, cycle_angle):
+        return self._lookup(self.temperature, self._temperature, cycle_angle)
+
+    @property
+    def peak_pressure(self):
+        return float(self.pressure.max())
+
+
+def wiebe(angle, start, duration, a, m):
+    # Cumulative mass fraction burned
+    progress = np.clip((angle - start) / duration, 0.0, None)
+    return 1.0 - np.exp(-a * progress ** (m + 1))
+
+
+def solve_cycle(parameters):
+    p = parameters
+    samples = 720 * p.steps_per_degree
+    angle = np.linspace(0.0, 720.0, samples + 1)
+    crank_angle = np.radians(angle) + TOP_DEAD_CENTRE_ANGLE
+    volume = cylinder_volume(crank_kinematics(p.crank_radius, p.rod_length), crank_angle, p.bore, p.compression_ratio)
+
+    # Trapped charge at intake valve closing (bottom dead centre), via the ideal gas law in gas.py
+    closing = 180 * p.steps_per_degree
+    opening = 540 * p.steps_per_degree
+    charge_mass = p.intake_pressure * volume[closing] * MOLAR_MASS_AIR / (8.314 * p.intake_temperature)
+    charge = GasSimulation(initial_volume=volume[closing], initial_temperature=p.intake_temperature, initial_mass=charge_mass)
+
+    burned = wiebe(angle, p.ignition_angle, p.burn_duration, p.wiebe_a, p.wiebe_m)
+    heat = charge_mass / p.air_fuel_ratio * p.fuel_heating_value * p.combustion_efficiency * burned
+
+    pressure = np.empty(samples + 1)
+    pressure[:closing] = p.intake_pressure
+    pressure[closing] = charge.pressure
+    # Closed part of the cycle: polytropic compression/expansion plus heat release,
+    # p2 = p1 (V1/V2)^n + (n - 1) dQ / V2
+    for k in range(closing, opening):
+        n = p.compression_exponent if angle[k] < p.ignition_angle else p.expansion_exponent
+        pressure[k + 1] = pressure[k] * (volume[k] / volume[k + 1]) ** n + (n - 1) * (heat[k + 1] - heat[k]) / volume[k + 1]
+    # Exhaust valve opens at bottom dead centre and the cylinder blows down
+    pressure[opening + 1:] = p.exhaust_pressure
+
+    temperature = charge.calculate_temperature(pressure, volume)
+    temperature[:closing] = p.intake_temperature
+    return CycleTrace(parameters, angle, volume, pressure, temperature, burned)
+
+
+@lru_cache(maxsize=64)
+def cycle_trace(parameters):
+    # Traces are pure functions of the parameter set, so repeated lookups share one solve
+    return solve_cycle(parameters)
@@ -0,0 +1,142 @@
+import numpy as np
+from particles import PARTICLE_DIAMETER
+
+# Forward half of the 8-neighbourhood, so every adjacent pair of cells is visited once
+NEIGHBOUR_OFFSETS = ((0, 0), (1, -1), (1, 0), (1, 1), (0, 1))
+
+
+class CellList:
+    # Uniform grid over the container, rebuilt with a counting sort on flat cell ids.
+    # Cells are at least `reach` wide so every pair closer than `reach` lies in the
+    # same or an adjacent cell; the grid is padded by one cell on each side so
+    # neighbour ids never need bounds checks.
+    def __init__(self, reach=PARTICLE_DIAMETER):
+        self.reach = reach
+        self._geometry = None
+        self.columns = self.rows = 1
+        self.cell_width = self.cell_height = reach
+
+    def _fit(self, rect):
+        geometry = (rect.left, rect.top, rect.width, rect.height, self.reach)
+        if geometry == self._geometry:
+            return
+        self._geometry = geometry
+        # As many whole cells as fit, stretched to cover the container exactly
+        self.columns = max(1, int(rect.width // self.reach))
+        self.rows = max(1, int(rect.height // self.reach))
+        self.cell_width = rect.width / self.columns
+        self.cell_height = rect.height / self.rows
+        self._stride = self.rows + 2
+        self._cell_count = (self.columns + 2) * self._stride
+        self._cell_dtype = np.uint16 if self._cell_count <= np.iinfo(np.uint16).max else np.uint32
+
+    @property
+    def grid_size(self):
+        return min(self.cell_width, self.cell_height)
+
+    @property
+    def cell_count(self):
+        # Cell ids run from 0 to cell_count - 1, padding included
+        return self._cell_count
+
+    def cell_id(self, grid_x, grid_y):
+        return (grid_x + 1) * self._stride + (grid_y + 1)
+
+    def neighbourhood(self, cell):
+        # Ids of the 3x3 block of cells centred on `cell`
+        stride = self._stride
+        return (cell - stride - 1, cell - stride, cell - stride + 1, cell - 1, cell, cell + 1,
+                cell + stride - 1, cell + stride, cell + stride + 1)
+
+    def build(self, positions, rect):
+        self._fit(rect)
+        self.grid_x = ((positions[:, 0] - rect.left) // self.cell_width).astype(np.intp)
+        self.grid_y = ((positions[:, 1] - rect.top) // self.cell_height).astype(np.intp)
+        np.clip(self.grid_x, 0, self.columns - 1, out=self.grid_x)
+        np.clip(self.grid_y, 0, self.rows - 1, out=self.grid_y)
+        self.cells = self.cell_id(self.grid_x, self.grid_y)
+
+        # Stable sort on a 16-bit key is a radix sort, so this stays O(N)
+        self.order = np.argsort(self.cells.astype(self._cell_dtype), kind='stable')
+        self.rank = np.empty(len(positions), dtype=np.intp)
+        self.rank[self.order] = np.arange(len(positions))
+        self.counts = np.bincount(self.cells, minlength=self._cell_count)
+        self.starts = np.cumsum(self.counts) - self.counts
+
+    def pairs(self):
+        # Pair each particle with the members of its own cell (later in sort order) and of
+        # the forward neighbour cells. Cost is linear in particles plus emitted pairs.
+        count = len(self.cells)
+        first, second = [], []
+        for offset_x, offset_y in NEIGHBOUR_OFFSETS:
+            neighbour_cells = self.cells + offset_x * self._stride + offset_y
+            repeats = self.counts[neighbour_cells]
+            total = repeats.sum()
+            if total == 0:
+                continue
+            i = np.repeat(np.arange(count), repeats)
+            local = np.arange(total) - np.repeat(np.cumsum(repeats) - repeats, repeats)
+            j = self.order[np.repeat(self.starts[neighbour_cells], repeats) + local]
+            if offset_x == 0 and offset_y == 0:
+                keep = self.rank[j] > self.rank[i]
+                i, j = i[keep], j[keep]
+            first.append(i)
+            second.append(j)
+
+        if not first:
+            empty = np.empty(0, dtype=np.intp)
+            return empty, empty
+        return np.concatenate(first), np.concatenate(second)
+
+    def update(self, store, rect):
+        positions = store.positions
+        self.build(positions, rect)
+        first, second = self.pairs()
+        return first, second, self.grid_x, self.grid_y
+
+
+class NeighbourList:
+    # Verlet list: pairs within cutoff + skin, reused until some particle has moved more
+    # than half the skin (or particles were added/removed, or the container changed).
+    def __init__(self, skin=1.0, cutoff=PARTICLE_DIAMETER):
+        self.skin = skin
+        self.cutoff = cutoff
+        self.cells = CellList(reach=cutoff + skin)
+        self.rebuilds = 0
+        self._reference = None
+        self._generation = None
+        self._geometry = None
+
+    @property
+    def grid_size(self):
+        return self.cells.grid_size
+
+    def needs_rebuild(self, store, rect):
+        if self._reference is None or store.generation != self._generation:
+            return True
+        if (rect.left, rect.top, rect.width, rect.height) != self._geometry:
+            return True
+        displacement = store.positions - self._reference
+        moved = np.einsum('ij,ij->i', displacement, displacement)
+        return len(moved) > 0 and moved.max() > (self.skin / 2) ** 2
+
+    def update(self, store, rect):
+        if self.needs_rebuild(store, rect):
+            self.rebuild(store, rect)
+        return self.first, self.second, self.grid_x, self.grid_y
+
+    def rebuild(self, store, rect):
+        positions = store.positions
+        self.cells.build(positions, rect)
+        first, second = self.cells.pairs()
+        delta = positions[first] - positions[second]
+        keep = np.einsum('ij,ij->i', delta, delta) < (self.cutoff + self.skin) ** 2
+        self.first = first[keep]
+        self.second = second[keep]
+        # Home cells at build time; the collision scheduler colours pairs by these
+        self.grid_x = self.cells.grid_x
+        self.grid_y = self.cells.grid_y
+        self._reference = positions.copy()
+        self._generation = store.generation
+        self._geometry = (rect.left, rect.top, rect.width, rect.height)
+        self.rebuilds += 1
@@ -1,16 +1,180 @@
+import numpy as np
+
+MOLAR_MASS_AIR = 0.02897  # kg/mol
+EOS_NAMES = ('ideal', 'van-der-waals')
+
+
+class IdealGas:
+    # PV = nRT
+    def pressure(self, moles, volume, temperature, R):
+        return moles * R * temperature / volume
+
+    def temperature(self, pressure, moles, volume, R):
+        return pressure * volume / (moles * R)
+
+
+class VanDerWaals:
+    # (P + a n^2/V^2)(V - nb) = nRT; the defaults are air, a in Pa m^6/mol^2 and b in m^3/mol
+    def __init__(self, a=0.1358, b=3.64e-5):
+        self.a = a
+        self.b = b
+
+    def pressure(self, moles, volume, temperature, R):
+        return moles * R * temperature / (volume - moles * self.b) - self.a * moles * moles / (volume * volume)
+
+    def temperature(self, pressure, moles, volume, R):
+        return (pressure + self.a * moles * moles / (volume * volume)) * (volume - moles * self.b) / (moles * R)
+
+
+class TabulatedEOS:
+    # Pressure tabulated over temperature (K) and molar volume (m^3/mol), bilinear in between and
+    # linear beyond the edges. The coefficients of every cell are computed once with the table, so a
+    # lookup is two index searches and one polynomial per state. R is ignored: the table is the gas.
+    def __init__(self, temperatures, molar_volumes, pressures):
+        self.temperatures = np.asarray(temperatures, dtype=float)
+        self.molar_volumes = np.asarray(molar_volumes, dtype=float)
+        self.pressures = np.asarray(pressures, dtype=float)
+        if self.pressures.shape != (len(self.temperatures), len(self.molar_volumes)):
+            raise ValueError("pressures must have one row per temperature and one column per molar volume")
+
+        p = self.pressures
+        dt = np.diff(self.temperatures)[:, None]
+        dv = np.diff(self.molar_volumes)[None, :]
+        # p = c0 + ct (T - T0) + cv (v - v0) + ctv (T - T0)(v - v0) inside each cell
+        # stacked so a lookup gathers all four with one fancy index
+        self._coefficients = np.stack([
+            p[:-1, :-1],
+            (p[1:, :-1] - p[:-1, :-1]) / dt,
+            (p[:-1, 1:] - p[:-1, :-1]) / dv,
+            (p[1:, 1:] - p[1:, :-1] - p[:-1, 1:] + p[:-1, :-1]) / (dt * dv),
+        ], axis=-1)
+
+    @classmethod
+    def from_eos(cls, eos, temperatures, molar_volumes, R=8.314):
+        # Tabulate another equation of state, e.g. to replace an expensive one
+        t, v = np.meshgrid(temperatures, molar_volumes, indexing='ij')
+        return cls(temperatures, molar_volumes, eos.pressure(1.0, v, t, R))
+
+    @classmethod
+    def load(cls, path):
+        # .npz with 'temperatures', 'molar_volumes' and 'pressures' arrays
+        with np.load(path) as data:
+            return cls(data['temperatures'], data['molar_volumes'], data['pressures'])
+
+    def _cell(self, axis, values):
+        return np.clip(np.searchsorted(axis, values, side='right') - 1, 0, len(axis) - 2)
+
+    def _molar_volume(self, moles, volume):
+        return volume / np.maximum(moles, 1e-300)
+
+    def pressure(self, moles, volume, temperature, R):
+        molar_volume = self._molar_volume(moles, volume)
+        i = self._cell(self.temperatures, temperature)
+        j = self._cell(self.molar_volumes, molar_volume)
+        dt = temperature - self.temperatures[i]
+        dv = molar_volume - self.molar_volumes[j]
+        c0, ct, cv, ctv = np.moveaxis(self._coefficients[i, j], -1, 0)
+        pressure = np.where(moles > 0, c0 + ct * dt + cv * dv + ctv * dt * dv, 0.0)
+        return pressure if pressure.ndim else float(pressure)
+
+    def temperature(self, pressure, moles, volume, R):
+        # Pressure along the temperature axis at each state's molar volume, then the linear
+        # inverse within the bracketing cell; assumes pressure rises with temperature
+        molar_volume = np.atleast_1d(self._molar_volume(moles, volume))
+        pressure = np.broadcast_to(pressure, molar_volume.shape)
+        j = self._cell(self.molar_volumes, molar_volume)
+        along = self.pressures[:, j] + (self.pressures[:, j + 1] - self.pressures[:, j]) * (
+            (molar_volume - self.molar_volumes[j]) / (self.molar_volumes[j + 1] - self.molar_volumes[j]))
+        i = np.clip((along <= pressure).sum(axis=0) - 1, 0, len(self.temperatures) - 2)
+        columns = np.arange(len(j))
+        low, high = along[i, columns], along[i + 1, columns]
+        temperature = self.temperatures[i] + (pressure - low) * (self.temperatures[i + 1] - self.temperatures[i]) / (high - low)
+        return temperature if np.ndim(volume) or np.ndim(moles) else temperature[0]
+
+
+def equation_of_state(name):
+    # 'ideal', 'van-der-waals', or the path of a TabulatedEOS .npz file
+    if name == 'ideal':
+        return IdealGas()
+    if name == 'van-der-waals':
+        return VanDerWaals()
+    if name.endswith('.npz'):
+        return TabulatedEOS.load(name)
+    raise ValueError(f"unknown equation of state {name!r}; use {', '.join(EOS_NAMES)} or a .npz table")
+
+
+class GasChambers:
+    # Volume, temperature and mass of many chambers as arrays; every operation covers all of them
+    # (or the chambers in `index`) with one vectorized call
+    def __init__(self, volume, temperature, mass, R=8.314, eos=None):
+        self.volume, self.temperature, self.mass = (np.array(a, dtype=float) for a in np.broadcast_arrays(
+            np.atleast_1d(volume), np.atleast_1d(temperature), np.atleast_1d(mass)))
+        self.R = R
+        self.eos = IdealGas() if eos is None else eos
+        self.pressure = self.calculate_pressure()
+
+    def __len__(self):
+        return len(self.volume)
+
+    def view(self, index):
+        return ChamberView(self, index)
+
+    def calculate_moles(self):
+        return self.mass / MOLAR_MASS_AIR
+
+    def calculate_pressure(self, index=slice(None)):
+        return self.eos.pressure(self.mass[index] / MOLAR_MASS_AIR, self.volume[index], self.temperature[index], self.R)
+
+    def calculate_temperature(self, pressure, volume=None):
+        volume = self.volume if volume is None else volume
+        return self.eos.temperature(pressure, self.calculate_moles(), volume, self.R)
+
+    def update(self, index=slice(None)):
+        self.pressure[index] = self.calculate_pressure(index)
+
+    def change(self, volume=0.0, temperature=0.0, mass=0.0, index=slice(None)):
+        # Apply any mix of deltas and recompute pressure once; mass never drops below zero
+        self.volume[index] += volume
+        self.temperature[index] += temperature
+        self.mass[index] = np.maximum(self.mass[index] + mass, 0.0)
+        self.update(index)
+
+    def change_volume(self, delta_volume, index=slice(None)):
+        self.change(volume=delta_volume, index=index)
+
+    def change_temperature(self, delta_temperature, index=slice(None)):
+        self.change(temperature=delta_temperature, index=index)
+
+    def add_gas(self, mass, index=slice(None)):
+        self.change(mass=mass, index=index)
+
+    def release_gas(self, mass, index=slice(None)):
+        self.change(mass=-np.asarray(mass), index=index)
+
+
 class GasSimulation:
-    def __init__(self, initial_volume, initial_temperature, initial_mass, R=8.314):
+    # One chamber as plain floats, the fast path for a single gas; ChamberView gives the same
+    # interface over one chamber of a GasChambers batch
+    def __init__(self, initial_volume, initial_temperature, initial_mass, R=8.314, eos=None):
         self.volume = initial_volume
         self.temperature = initial_temperature
         self.mass = initial_mass
         self.R = R
+        self.eos = IdealGas() if eos is None else eos
         self.pressure = self.calculate_pressure()
 
-    def calculate_pressure(self):
-        # Calculate pressure using the ideal gas law: PV = nRT => P = (nRT)/V
-        moles = self.mass / 0.02897  # Molar mass of air in kg/mol
-        pressure = (moles * self.R * self.temperature) / self.volume
-        return pressure
+    def calculate_moles(self):
+        return self.mass / MOLAR_MASS_AIR
+
+    def calculate_pressure(self, temperature=None):
+        # Pressure from the equation of state (ideal gas unless chosen otherwise); works on arrays of temperatures as well
+        temperature = self.temperature if temperature is None else temperature
+        return self.eos.pressure(self.calculate_moles(), self.volume, temperature, self.R)
+
+    def calculate_temperature(self, pressure, volume=None):
+        # Inverse of calculate_pressure; works on arrays of states as well
+        volume = self.volume if volume is None else volume
+        return self.eos.temperature(pressure, self.calculate_moles(), volume, self.R)
 
     def update(self):
         # Update pressure based on current volume, temperature, and mass
@@ -23,8 +187,6 @@ class GasSimulation:
     def change_temperature(self, delta_temperature):
         self.temperature += delta_temperature
         self.update()
-        for particle in self.ui.particles:  # Access the particles through the UI
-            particle.update_velocity(self.temperature)
 
     def add_gas(self, mass):
         self.mass += mass
@@ -33,3 +195,36 @@ class GasSimulation:
     def release_gas(self, mass):
         self.mass = max(self.mass - mass, 0)
         self.update()
+
+
+def _chamber_field(name):
+    # A scalar attribute of ChamberView backed by one element of a GasChambers array
+    def get(self):
+        return float(getattr(self.chambers, name)[self.index])
+
+    def set(self, value):
+        getattr(self.chambers, name)[self.index] = value
+
+    return property(get, set)
+
+
+class ChamberView(GasSimulation):
+    # GasSimulation over one chamber of a GasChambers batch. Reads and writes go straight to
+    # the batch, so either side sees the other's changes; each costs a NumPy index, which is
+    # why a lone GasSimulation keeps plain floats instead.
+    def __init__(self, chambers, index):
+        self.chambers = chambers
+        self.index = index
+
+    volume = _chamber_field('volume')
+    temperature = _chamber_field('temperature')
+    mass = _chamber_field('mass')
+    pressure = _chamber_field('pressure')
+
+    @property
+    def R(self):
+        return self.chambers.R
+
+    @property
+    def eos(self):
+        return self.chambers.eos
@@ -0,0 +1,41 @@
+import numpy as np
+from particles import kinetic_temperature
+
+
+class PressureGauge:
+    # Pressure and temperature measured from the particles over the last `window` frames.
+    # The integrator accumulates wall impulses as it goes; the temperature reads
+    # ParticleStore.square_speed_sum, one reduction per step shared with the thermostat.
+    def __init__(self, window=60):
+        self.window = window
+        self._impulse = np.zeros(window)  # Momentum delivered to the walls per particle, per frame
+        self._exposure = np.zeros(window)  # Wall area times frame length per frame
+        self._temperature = np.zeros(window)
+        self._index = 0
+        self._filled = 0
+        self.measured_temperature = 0.0
+        self.measured_pressure = 0.0
+
+    def sample(self, store, gas_sim, frames=1.0):
+        rect = store.container_rect
+        width, height, depth = rect.width, rect.height, rect.width
+        area = 2 * (height * depth + width * depth + width * height)
+
+        # Per particle, so the window stays meaningful when the particle budget resamples the store
+        self._impulse[self._index] = store.wall_impulse.sum() / store.count if store.count else 0.0
+        self._exposure[self._index] = area * frames
+        self._temperature[self._index] = kinetic_temperature(store.square_speed_sum / store.count) if store.count else 0.0
+        store.wall_impulse[:] = 0.0
+        self._index = (self._index + 1) % self.window
+        self._filled = min(self._filled + 1, self.window)
+
+        filled = slice(0, self._filled)
+        self.measured_temperature = self._temperature[filled].mean()
+        # Kinetic theory, P = N m <v^2> / 3V, turns the wall pressure per particle into the
+        # temperature that explains it; the equation of state then gives the same pressure in Pa
+        exposure = self._exposure[filled].sum()
+        wall_pressure = self._impulse[filled].sum() / exposure if exposure else 0.0
+        volume = width * height * depth
+        pressure_temperature = kinetic_temperature(3 * volume * wall_pressure)
+        self.measured_pressure = float(gas_sim.calculate_pressure(pressure_temperature))
+        return self.measured_pressure, self.measured_temperature
@@ -0,0 +1,100 @@
+import numpy as np
+from particles import PARTICLE_DIAMETER
+
+
+def kinetic_energy(store):
+    # Unit mass per molecule, so a particle of weight w carries w |v|^2 / 2
+    return 0.5 * store.weight * float(np.einsum('ij,ij->', store.velocities, store.velocities))
+
+
+def merge_particles(store, first, second):
+    # Each pair becomes one particle at its midpoint moving along the pair's momentum at the
+    # pair's RMS speed; the second row of every pair is removed
+    pos = store.positions
+    vel = store.velocities
+    square_speed = (np.einsum('ij,ij->i', vel[first], vel[first]) + np.einsum('ij,ij->i', vel[second], vel[second])) / 2
+    momentum = vel[first] + vel[second]
+    norm = np.sqrt(np.einsum('ij,ij->i', momentum, momentum))
+    # Head-on pairs have no net direction; keep the first particle's
+    direction = np.where(norm[:, None] > 0, momentum, vel[first])
+    length = np.sqrt(np.einsum('ij,ij->i', direction, direction))
+    direction /= np.where(length > 0, length, 1.0)[:, None]
+
+    pos[first] = (pos[first] + pos[second]) / 2
+    vel[first] = direction * np.sqrt(square_speed)[:, None]
+    store.pressure_ratio[first] = (store.pressure_ratio[first] + store.pressure_ratio[second]) / 2
+    store.remove(second)
+
+
+def split_particles(store, indices, rng):
+    # Each chosen particle gets a twin one diameter away in a random direction, same velocity
+    copies = store.take(indices)
+    offset = rng.normal(size=(len(indices), 3))
+    offset *= PARTICLE_DIAMETER / np.maximum(np.linalg.norm(offset, axis=1), 1e-12)[:, None]
+    lower, upper = store.bounds()
+    copies['positions'] = np.clip(copies['positions'] + offset, lower, upper)
+    store.add(**copies)
+
+
+def resample(store, target, rng):
+    # Change the number of particles to `target` (at most halving or doubling), keeping the
+    # total mass (count * weight) and kinetic energy exactly
+    count = store.count
+    target = int(min(max(target, (count + 1) // 2), 2 * count))
+    if count == 0 or target == count:
+        return
+    mass = count * store.weight
+    energy = kinetic_energy(store)
+
+    if target < count:
+        # Neighbours in a coarse grid order are close in space, so pair them up
+        cell = 4 * PARTICLE_DIAMETER
+        order = np.lexsort(((store.y // cell), (store.x // cell)))
+        pairs = len(order) // 2
+        chosen = rng.choice(pairs, size=count - target, replace=False)
+        merge_particles(store, order[0:2 * pairs:2][chosen], order[1:2 * pairs:2][chosen])
+    else:
+        split_particles(store, rng.choice(count, size=target - count, replace=False), rng)
+
+    store.weight = mass / store.count
+    after = kinetic_energy(store)
+    if after > 0:
+        store.velocities[:] *= np.sqrt(energy / after)
+        store.velocities_changed()
+
+
+class ParticleBudget:
+    # Level-of-detail governor: keeps the particle step near `budget` seconds by merging
+    # particles into heavier ones when it runs slow and splitting them again when there is
+    # headroom, never below one molecule weight unit per particle.
+    def __init__(self, budget=0.008, interval=30, tolerance=0.25, min_particles=100, smoothing=0.1):
+        self.budget = budget
+        self.interval = interval  # Frames between adjustments
+        self.tolerance = tolerance  # Dead band around the budget, as a fraction
+        self.min_particles = min_particles
+        self.smoothing = smoothing
+        self.average = None
+        self.adjustments = 0
+        self._frames = 0
+
+    def record(self, seconds):
+        self.average = seconds if self.average is None else self.average + self.smoothing * (seconds - self.average)
+
+    def update(self, store, seconds, rng):
+        self.record(seconds)
+        self._frames += 1
+        if self._frames < self.interval or store.count == 0:
+            return
+        self._frames = 0
+
+        ratio = self.average / self.budget
+        if 1 - self.tolerance <= ratio <= 1 + self.tolerance:
+            return
+        # Cost is close to linear in the particle count
+        target = int(store.count / ratio)
+        ceiling = int(round(store.count * store.weight))  # Every particle back to a single unit
+        target = min(max(target, self.min_particles), ceiling)
+        if target != store.count:
+            resample(store, target, rng)
+            self.adjustments += 1
+            self.average = None  # The old timings describe the old count
@@ -0,0 +1,120 @@
+import argparse
+import csv
+import os
+import sys
+import time
+
+# No window and no audio device: only fonts are initialised, and that works without a display
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')  # Keep stdout clean for the sample stream
+
+import pygame
+from gas import EOS_NAMES, GasSimulation, equation_of_state
+from ui import UIDiagnostics
+from thermostat import MODES as THERMOSTAT_MODES
+from recorder import GAS_FIELDS, TraceWriter, record_gas
+
+STEP_SECONDS = 1 / 60  # One particle step is one frame of the interactive view
+SAMPLE_FIELDS = ('step', 'time', 'pressure', 'temperature', 'measured_pressure', 'measured_temperature',
+                 'volume', 'mass', 'particles')
+
+
+class BatchRunner:
+    def __init__(self, gas_sim, ui, trace=None):
+        self.gas_sim = gas_sim
+        self.ui = ui
+        self.trace = trace  # Optional TraceWriter over GAS_FIELDS, appended to every step
+        self.step_count = 0
+
+    def step(self):
+        self.gas_sim.update()
+        self.ui.update()
+        self.step_count += 1
+        if self.trace is not None:
+            record_gas(self.trace, self.step_count, self.step_count * STEP_SECONDS, self.gas_sim, self.ui)
+
+    def sample(self):
+        return {
+            'step': self.step_count,
+            'time': self.step_count * STEP_SECONDS,
+            'pressure': self.gas_sim.pressure,
+            'temperature': self.gas_sim.temperature,
+            'measured_pressure': self.ui.gauge.measured_pressure,
+            'measured_temperature': self.ui.gauge.measured_temperature,
+            'volume': self.gas_sim.volume,
+            'mass': self.gas_sim.mass,
+            'particles': len(self.ui.particles),
+        }
+
+    def run(self, steps, sample_every=1, on_sample=None):
+        # Advance as fast as possible; returns (steps, wall seconds)
+        start = time.perf_counter()
+        for _ in range(steps):
+            self.step()
+            if on_sample is not None and self.step_count % sample_every == 0:
+                on_sample(self.sample())
+        return steps, time.perf_counter() - start
+
+
+def create_runner(volume=10.0, temperature=300, mass=10.0, seed=None, collision_backend='serial', workers=None, event_driven=False,
+                  frame_budget=None, thermostat='instant', eos=None):
+    pygame.font.init()
+    gas_sim = GasSimulation(initial_volume=volume, initial_temperature=temperature, initial_mass=mass, eos=eos)
+    ui = UIDiagnostics(gas_sim, pygame.time.Clock(), seed=seed, collision_backend=collision_backend, workers=workers,
+                       event_driven=event_driven, frame_budget=frame_budget, thermostat=thermostat)
+    return BatchRunner(gas_sim, ui)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the gas simulation without a window at full speed.")
+    length = parser.add_mutually_exclusive_group(required=True)
+    length.add_argument('--steps', type=int, help="number of fixed steps to simulate")
+    length.add_argument('--seconds', type=float, help="simulated seconds (60 steps per second)")
+    parser.add_argument('--output', default='-', help="CSV file for samples, '-' for stdout")
+    parser.add_argument('--sample-every', type=int, default=1, help="write a sample every N steps")
+    parser.add_argument('--volume', type=float, default=10.0)
+    parser.add_argument('--temperature', type=float, default=300)
+    parser.add_argument('--mass', type=float, default=10.0)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--backend', choices=('serial', 'thread', 'process'), default='serial')
+    parser.add_argument('--workers', type=int, default=None, help="threads or processes for the parallel backends (default: CPU count)")
+    parser.add_argument('--event-driven', action='store_true', help="jump between exact collision times instead of stepping")
+    parser.add_argument('--budget-ms', type=float, default=None, help="merge or split particles to keep each step near this cost")
+    parser.add_argument('--thermostat', choices=THERMOSTAT_MODES, default='instant', help="how particle velocities follow the temperature")
+    parser.add_argument('--eos', type=equation_of_state, default='ideal', help=f"equation of state: {', '.join(EOS_NAMES)} or a .npz table")
+    parser.add_argument('--record', metavar='PATH', help="write every step to a binary trace for replay (main.py --replay)")
+    parser.add_argument('--keyframe-every', type=int, default=60, help="steps between stored particle frames in the trace")
+    parser.add_argument('--trace-particles', type=int, default=4096, help="particle slots per frame; larger gases are decimated")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    steps = args.steps if args.steps is not None else int(round(args.seconds / STEP_SECONDS))
+    runner = create_runner(args.volume, args.temperature, args.mass, args.seed, args.backend, args.workers, args.event_driven,
+                           args.budget_ms / 1000 if args.budget_ms else None, args.thermostat, args.eos)
+
+    if args.record is not None:
+        metadata = {'source': 'headless', 'step_seconds': STEP_SECONDS, 'seed': args.seed, 'event_driven': args.event_driven}
+        runner.trace = TraceWriter(args.record, GAS_FIELDS, rows=max(1, args.keyframe_every),
+                                   particles=args.trace_particles, metadata=metadata)
+
+    output = sys.stdout if args.output == '-' else open(args.output, 'w', newline='')
+    try:
+        writer = csv.DictWriter(output, fieldnames=SAMPLE_FIELDS)
+        writer.writeheader()
+        steps, elapsed = runner.run(steps, max(1, args.sample_every), writer.writerow)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        runner.ui.collisions.close()
+        if runner.trace is not None:
+            runner.trace.close()
+
+    rate = steps / elapsed if elapsed > 0 else float('inf')
+    print(f"{steps} steps in {elapsed:.3f} s ({rate:.1f} steps/s, {len(runner.ui.particles)} particles)", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
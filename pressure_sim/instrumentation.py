@@ -0,0 +1,160 @@
+import json
+import time
+from contextlib import nullcontext
+import numpy as np
+
+FRAME = 'frame'
+PERCENTILES = (50, 95, 99)
+_DISABLED = nullcontext()  # Shared no-op scope, so a disabled profiler allocates nothing per call
+
+
+class _Scope:
+    # Reusable timer for one phase; scopes of the same name are not expected to nest
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class StartupTimer:
+    # Wall time from construction to named milestones of start-up, e.g. 'window' and 'first_frame'.
+    # Only the first mark of each name counts, so marks can sit inside the main loop.
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.marks = {}
+
+    def mark(self, name):
+        if name not in self.marks:
+            self.marks[name] = time.perf_counter() - self.start
+        return self.marks[name]
+
+    def report(self):
+        return ', '.join(f"{name} {seconds * 1e3:.0f} ms" for name, seconds in self.marks.items())
+
+
+class PhaseTimer:
+    # Fixed-size ring buffer of durations (seconds) for one phase
+    def __init__(self, capacity):
+        self.samples = np.zeros(capacity)
+        self.index = 0
+        self.filled = 0
+        self.pending = 0.0  # Time recorded since the last end_frame(); a phase may run several times per frame
+
+    def push(self, seconds):
+        self.samples[self.index] = seconds
+        self.index = (self.index + 1) % len(self.samples)
+        self.filled = min(self.filled + 1, len(self.samples))
+
+    def stats(self):
+        if self.filled == 0:
+            return None
+        samples = self.samples[:self.filled]
+        p50, p95, p99 = np.percentile(samples, PERCENTILES)
+        return {'p50': p50, 'p95': p95, 'p99': p99, 'mean': samples.mean(), 'max': samples.max(), 'samples': self.filled}
+
+
+class FrameProfiler:
+    # Named timing scopes summed per frame and kept for the last `capacity` frames.
+    #
+    #     with profiler.scope('collisions'):
+    #         ...
+    #     profiler.end_frame()
+    #
+    # Disabled, scope() returns a shared no-op context and end_frame() returns at once.
+    def __init__(self, enabled=False, capacity=600, dump_path=None, dump_every=600, overlay_every=30):
+        self.enabled = enabled
+        self.capacity = capacity
+        self.dump_path = dump_path
+        self.dump_every = dump_every  # Frames between appends to dump_path
+        self.overlay_every = overlay_every  # Frames between overlay text refreshes
+        self.show_overlay = enabled
+        self.frames = 0
+        self.phases = {}
+        self._scopes = {}
+        self._frame_start = None
+        self._overlay = None
+        self._overlay_frame = -1
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+        self._frame_start = None
+
+    def scope(self, name):
+        if not self.enabled:
+            return _DISABLED
+        scope = self._scopes.get(name)
+        if scope is None:
+            scope = self._scopes[name] = _Scope(self, name)
+        return scope
+
+    def phase(self, name):
+        timer = self.phases.get(name)
+        if timer is None:
+            timer = self.phases[name] = PhaseTimer(self.capacity)
+        return timer
+
+    def record(self, name, seconds):
+        self.phase(name).pending += seconds
+
+    def end_frame(self):
+        # Closes the frame: pushes each phase's total and the wall time since the previous call
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        for name, timer in self.phases.items():
+            if name != FRAME:
+                timer.push(timer.pending)
+                timer.pending = 0.0
+        if self._frame_start is not None:
+            self.phase(FRAME).push(now - self._frame_start)
+        self._frame_start = now
+        self.frames += 1
+        if self.dump_path is not None and self.frames % self.dump_every == 0:
+            self.dump(self.dump_path)
+
+    def stats(self):
+        # {phase: {'p50', 'p95', 'p99', 'mean', 'max' (seconds), 'samples'}}
+        stats = {}
+        for name, timer in self.phases.items():
+            phase_stats = timer.stats()
+            if phase_stats is not None:
+                stats[name] = phase_stats
+        return stats
+
+    def dump(self, path):
+        # One JSON line per dump, so a long session produces a time series
+        record = {'time': time.time(), 'frame': self.frames, 'phases': self.stats()}
+        with open(path, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+
+    def report_lines(self):
+        lines = []
+        for name, phase_stats in self.stats().items():
+            lines.append(f"{name:<12} p50 {phase_stats['p50'] * 1e3:6.2f}  p95 {phase_stats['p95'] * 1e3:6.2f}"
+                         f"  p99 {phase_stats['p99'] * 1e3:6.2f} ms")
+        return lines
+
+    def draw_overlay(self, screen, font, pos=(10, 10), color=(255, 255, 0)):
+        # Text is re-rendered every `overlay_every` frames; in between the cached surfaces are blitted
+        # Returns the rects drawn, for callers that only update dirty regions
+        if not (self.enabled and self.show_overlay):
+            return []
+        if self._overlay is None or self.frames - self._overlay_frame >= self.overlay_every:
+            self._overlay = [font.render(line, True, color) for line in self.report_lines()]
+            self._overlay_frame = self.frames
+        x, y = pos
+        rects = []
+        for surface in self._overlay:
+            rects.append(screen.blit(surface, (x, y)))
+            y += surface.get_height()
+        return rects
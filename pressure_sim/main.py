@@ -1,46 +1,213 @@
+import argparse
 import cProfile
 import pstats
+import sys
 import pygame
-from gas import GasSimulation
-from ui import UIDiagnostics
+from gas import EOS_NAMES, GasSimulation, equation_of_state
+from ui import GasSnapshot, UIDiagnostics
+from instrumentation import FrameProfiler, StartupTimer
+from recorder import GAS_FIELDS, TraceReader, TraceWriter, record_gas
+from text_cache import text_cache
+from thermostat import MODES as THERMOSTAT_MODES
+from snapshot import SimulationWorker, SnapshotBuffer
 
-# Initialize Pygame and create a screen
-pygame.init()
+startup = StartupTimer()
+parser = argparse.ArgumentParser(description="Interactive gas simulation")
+parser.add_argument('--phases', action='store_true', help="time each frame phase and show the overlay (F3 toggles it)")
+parser.add_argument('--phase-dump', metavar='PATH', help="append phase statistics to PATH as JSON lines")
+parser.add_argument('--budget-ms', type=float, default=8.0, help="particle step budget; particles are merged or split to stay near it (0 disables)")
+parser.add_argument('--thermostat', choices=THERMOSTAT_MODES, default='instant', help="how particle velocities follow the temperature")
+parser.add_argument('--eos', type=equation_of_state, default='ideal', help=f"equation of state: {', '.join(EOS_NAMES)} or a .npz table")
+parser.add_argument('--record', metavar='PATH', help="write every frame to a binary trace")
+parser.add_argument('--startup-time', action='store_true', help="print how long start-up took, up to the first frame")
+parser.add_argument('--threaded', action='store_true', help="step the simulation on its own thread; the window draws the latest snapshot "
+                    "(with --phase-dump, the simulation's phases go to PATH.simulation)")
+parser.add_argument('--replay', metavar='PATH', help="play back a trace: space pauses, arrows seek a second, page keys a tenth")
+args = parser.parse_args()
+frame_profiler = FrameProfiler(enabled=args.phases or args.phase_dump is not None, dump_path=args.phase_dump)
+frame_profiler.show_overlay = args.phases
+
+# Initialize Pygame and create a screen; fonts are opened by the UI when it first needs them
+pygame.display.init()
 screen = pygame.display.set_mode((800, 600))
 pygame.display.set_caption("Gas Simulation")
+startup.mark('window')
 
 # Initialize gas simulation and clock
-gas_sim = GasSimulation(initial_volume=10.0, initial_temperature=300, initial_mass=10.0)
+gas_sim = GasSimulation(initial_volume=10.0, initial_temperature=300, initial_mass=10.0, eos=args.eos)
 clock = pygame.time.Clock()
-ui = UIDiagnostics(gas_sim, clock)
+ui = UIDiagnostics(gas_sim, clock, profiler=frame_profiler, frame_budget=args.budget_ms / 1000 if args.budget_ms > 0 else None,
+                   thermostat=args.thermostat)
+startup.mark('simulation')
+trace = None
+if args.record is not None:
+    trace = TraceWriter(args.record, GAS_FIELDS, rows=60, particles=4096, metadata={'source': 'interactive', 'step_seconds': 1 / 60})
+
+def simulate_step():
+    # Update the gas simulation and UI
+    gas_sim.update()
+    ui.update()
+    if trace is not None:
+        record_gas(trace, trace.steps + 1, (trace.steps + 1) / 60, gas_sim, ui)
+
+def first_frame_done():
+    if args.startup_time and 'first_frame' not in startup.marks:
+        startup.mark('first_frame')
+        print(f"startup: {startup.report()}", file=sys.stderr)
+
+def finish():
+    if args.phase_dump is not None:
+        frame_profiler.dump(args.phase_dump)
+    if trace is not None:
+        trace.close()
+
+    pygame.quit()
 
 # Profiling function
 def run_simulation():
     # Main loop
     running = True
     while running:
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                running = False
-            ui.handle_event(event)
+        with frame_profiler.scope('events'):
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    running = False
+                ui.handle_event(event)
 
-        # Update the gas simulation and UI
-        gas_sim.update()
-        ui.update()
+        simulate_step()
 
         # Draw the UI diagnostics
         screen.fill((0, 0, 0))  # Clear screen with black color
         ui.draw(screen)
 
-        pygame.display.flip()  # Update the display
+        with frame_profiler.scope('flip'):
+            pygame.display.flip()  # Update the display
+        frame_profiler.end_frame()
+        first_frame_done()
         clock.tick(60)  # Limit to 60 frames per second
 
+    finish()
+
+def run_threaded():
+    # The simulation steps at 60 per second on a worker thread; this loop only forwards input
+    # and draws the newest snapshot, so a slow step no longer delays input or the flip
+    # FrameProfiler is not thread-safe, so the worker times its steps on a profiler of its own
+    # and the overlay only shows the render loop's phases
+    step_profiler = FrameProfiler(enabled=frame_profiler.enabled,
+                                  dump_path=None if args.phase_dump is None else args.phase_dump + '.simulation')
+    ui.step_profiler = step_profiler
+
+    def step():
+        simulate_step()
+        step_profiler.end_frame()
+
+    buffer = SnapshotBuffer(lambda: GasSnapshot(ui))
+    worker = SimulationWorker(step, lambda snapshot: snapshot.capture(ui, worker.steps), buffer, rate=60)
+    worker.start()
+    running = True
+    while running:
+        with frame_profiler.scope('events'):
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    running = False
+                else:
+                    worker.submit(ui.handle_event, event)
+        worker.check()
+
+        screen.fill((0, 0, 0))
+        snapshot = buffer.acquire()
+        if snapshot is not None:
+            ui.draw(screen, snapshot)
+            status = f"simulation {worker.steps_per_second:.0f} steps/s"
+            screen.blit(text_cache.render(ui.fps_font, status, True, (255, 255, 255)), (20, screen.get_height() - 30))
+
+        with frame_profiler.scope('flip'):
+            pygame.display.flip()
+        frame_profiler.end_frame()
+        first_frame_done()
+        clock.tick(60)
+
+    worker.stop()
+    if step_profiler.dump_path is not None:
+        step_profiler.dump(step_profiler.dump_path)
+    finish()
+
+def run_replay(path):
+    # Scalars are exact for every step; particles are restored at each keyframe and drift
+    # freely (no collisions) between keyframes, so a seek restores the keyframe before the
+    # new step and drifts from there
+    reader = TraceReader(path)
+    if len(reader) == 0:
+        print(f"{path} holds no steps")
+        return
+    step_seconds = reader.metadata.get('step_seconds', 1 / 60)
+    second = max(1, int(round(1 / step_seconds)))
+    step = 0
+    shown = None
+    paused = False
+    running = True
+    while running:
+        with frame_profiler.scope('events'):
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    running = False
+                elif event.type == pygame.KEYDOWN:
+                    if event.key == pygame.K_SPACE:
+                        paused = not paused
+                    elif event.key in (pygame.K_LEFT, pygame.K_RIGHT):
+                        step += second if event.key == pygame.K_RIGHT else -second
+                    elif event.key in (pygame.K_PAGEUP, pygame.K_PAGEDOWN):
+                        step += len(reader) // 10 if event.key == pygame.K_PAGEDOWN else -(len(reader) // 10)
+                    elif event.key == pygame.K_HOME:
+                        step = 0
+                    elif event.key == pygame.K_F3:
+                        frame_profiler.show_overlay = not frame_profiler.show_overlay
+        step = min(max(step, 0), len(reader) - 1)
+
+        record = reader.step(step)
+        gas_sim.volume = float(record['volume'])
+        gas_sim.temperature = float(record['temperature'])
+        gas_sim.mass = float(record['mass'])
+        gas_sim.pressure = float(record['pressure'])
+        ui.gauge.measured_pressure = float(record['measured_pressure'])
+        ui.gauge.measured_temperature = float(record['measured_temperature'])
+        ui.resize_container()
+        keyframe = reader.keyframe_step(step)
+        if shown == step - 1 and keyframe < step:
+            ui.particles.move()  # Playing on within a keyframe interval
+        elif shown != step:
+            positions, velocities, stride = reader.keyframe(step)
+            ui.particles.clear()
+            ui.particles.add(positions=positions, velocities=velocities)
+            ui.particles.weight = float(record['weight']) * stride
+            for _ in range(step - keyframe):
+                ui.particles.move()
+        shown = step  # The step the particles are at
+
+        screen.fill((0, 0, 0))
+        ui.draw(screen)
+        status = f"replay {step * step_seconds:.1f} / {len(reader) * step_seconds:.1f} s" + (" (paused)" if paused else "")
+        screen.blit(text_cache.render(ui.fps_font, status, True, (255, 255, 0)), (20, screen.get_height() - 30))
+
+        with frame_profiler.scope('flip'):
+            pygame.display.flip()
+        frame_profiler.end_frame()
+        first_frame_done()
+        clock.tick(60)
+        if not paused:
+            step += 1
+
     pygame.quit()
 
 # Profile the simulation
 profiler = cProfile.Profile()
 profiler.enable()
-run_simulation()
+if args.replay is not None:
+    run_replay(args.replay)
+elif args.threaded:
+    run_threaded()
+else:
+    run_simulation()
 profiler.disable()
 
 # Save the profiling results to a file
@@ -0,0 +1,322 @@
+import math
+import numpy as np
+
+PARTICLE_DIAMETER = 2.0  # Particles are treated as spheres with a diameter of 2 units
+SCALAR_PAIRS = 8  # Near pairs up to which resolve_pairs() loops instead of batching
+# Mean |v|^2 / speed^2 of thermal_velocities(): 1 + E[sin^2] of the uniform +-22.5 degree tilt
+SPEED_SQUARE_FACTOR = 1.5 - math.sin(math.pi / 4) / (math.pi / 2)
+
+
+def thermal_velocities(rng, count, temperature, pressure_ratio=1.0, angle_offset=0.0):
+    # Same distribution the per-object particles used: a +-30 degree cone in the
+    # xy-plane around angle_offset and a +-22.5 degree tilt out of the plane
+    speed = math.sqrt(temperature / 100.0) * pressure_ratio
+    angle_xy = rng.uniform(-math.pi / 6, math.pi / 6, count) + angle_offset
+    angle_z = rng.uniform(-math.pi / 8, math.pi / 8, count)
+    velocities = np.empty((count, 3))
+    velocities[:, 0] = speed * np.cos(angle_xy)
+    velocities[:, 1] = speed * np.sin(angle_xy)
+    velocities[:, 2] = speed * np.sin(angle_z)
+    return velocities
+
+
+def kinetic_temperature(mean_square_speed):
+    # Inverse of the speed = sqrt(T / 100) mapping used by thermal_velocities()
+    return 100.0 * mean_square_speed / SPEED_SQUARE_FACTOR
+
+
+def _resolve_each(pos, vel, first, second):
+    # resolve_pairs() for a few pairs, one at a time on Python floats
+    for i, j in zip(first, second):
+        dx = pos[i, 0] - pos[j, 0]
+        dy = pos[i, 1] - pos[j, 1]
+        dz = pos[i, 2] - pos[j, 2]
+        distance = math.sqrt(dx**2 + dy**2 + dz**2)
+
+        if 0 < distance < PARTICLE_DIAMETER:
+            overlap = (PARTICLE_DIAMETER - distance) / 2
+            nx = dx / distance
+            ny = dy / distance
+            nz = dz / distance
+
+            pos[i, 0] += nx * overlap
+            pos[i, 1] += ny * overlap
+            pos[i, 2] += nz * overlap
+            pos[j, 0] -= nx * overlap
+            pos[j, 1] -= ny * overlap
+            pos[j, 2] -= nz * overlap
+
+            dot = (vel[i, 0] - vel[j, 0]) * nx + (vel[i, 1] - vel[j, 1]) * ny + (vel[i, 2] - vel[j, 2]) * nz
+
+            vel[i, 0] -= dot * nx
+            vel[i, 1] -= dot * ny
+            vel[i, 2] -= dot * nz
+            vel[j, 0] += dot * nx
+            vel[j, 1] += dot * ny
+            vel[j, 2] += dot * nz
+
+
+def resolve_pairs(pos, vel, first, second):
+    # Resolve candidate pairs (first[k], second[k]) in order: overlaps are pushed apart
+    # and the normal velocity components exchanged. Pairs that are already apart when
+    # the call starts are skipped with one vectorized test. More than SCALAR_PAIRS near
+    # pairs are split into rounds of pairs that share no particle, each resolved with
+    # array operations (or one by one if it is small). A pair comes after every earlier
+    # pair that shares a particle with it, so the result matches resolving the pairs one
+    # by one up to rounding.
+    if len(first) == 0:
+        return
+    delta = pos[first] - pos[second]
+    near = np.einsum('ij,ij->i', delta, delta) < PARTICLE_DIAMETER ** 2
+    first, second = first[near], second[near]
+    if len(first) <= SCALAR_PAIRS:
+        _resolve_each(pos, vel, first.tolist(), second.tolist())
+        return
+
+    # Each pair's round is one past the last round either of its particles was in
+    rounds = []
+    busy = {}
+    for i, j in zip(first.tolist(), second.tolist()):
+        round_ = max(busy.get(i, 0), busy.get(j, 0))
+        rounds.append(round_)
+        busy[i] = busy[j] = round_ + 1
+    rounds = np.array(rounds)
+    order = np.argsort(rounds, kind='stable')
+    for batch in np.split(order, np.flatnonzero(np.diff(rounds[order])) + 1):
+        i, j = first[batch], second[batch]
+        if len(batch) <= SCALAR_PAIRS:
+            _resolve_each(pos, vel, i.tolist(), j.tolist())
+            continue
+
+        d = pos[i] - pos[j]
+        distance = np.sqrt(d[:, 0] ** 2 + d[:, 1] ** 2 + d[:, 2] ** 2)
+        hit = (0 < distance) & (distance < PARTICLE_DIAMETER)
+        if not hit.all():
+            i, j, d, distance = i[hit], j[hit], d[hit], distance[hit]
+        normal = d / distance[:, None]
+        shift = normal * ((PARTICLE_DIAMETER - distance) / 2)[:, None]
+        pos[i] += shift
+        pos[j] -= shift
+
+        dv = vel[i] - vel[j]
+        dot = dv[:, 0] * normal[:, 0] + dv[:, 1] * normal[:, 1] + dv[:, 2] * normal[:, 2]
+        impulse = dot[:, None] * normal
+        vel[i] -= impulse
+        vel[j] += impulse
+
+
+class ParticleStore:
+    # Structure-of-arrays particle container. Rows [0, count) are live; the
+    # arrays grow by doubling so appends stay amortised O(1).
+    def __init__(self, container_rect, capacity=256):
+        self.container_rect = container_rect
+        self.count = 0
+        self.generation = 0  # Bumped whenever rows are added, removed or reordered
+        self.weight = 1.0  # Molecule units each particle stands for; raised by the particle budget
+        # Momentum (unit mass) handed to the [lower, upper] wall of each axis by reflections,
+        # accumulated until a gauge collects it
+        self.wall_impulse = np.zeros((2, 3))
+        self._square_speed_sum = None  # Cached sum |v|^2, valid for _square_speed_generation
+        self._square_speed_generation = -1
+        self._allocate(max(capacity, 1))
+
+    def _allocate(self, capacity):
+        pos = np.zeros((capacity, 3))
+        vel = np.zeros((capacity, 3))
+        pressure_ratio = np.ones(capacity)
+        alpha = np.full(capacity, 255, dtype=np.int16)
+        exiting = np.zeros(capacity, dtype=bool)
+        if self.count:
+            n = self.count
+            pos[:n] = self.pos[:n]
+            vel[:n] = self.vel[:n]
+            pressure_ratio[:n] = self._pressure_ratio[:n]
+            alpha[:n] = self._alpha[:n]
+            exiting[:n] = self._exiting[:n]
+        self.pos = pos
+        self.vel = vel
+        self._pressure_ratio = pressure_ratio
+        self._alpha = alpha
+        self._exiting = exiting
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def capacity(self):
+        return len(self.pos)
+
+    @property
+    def positions(self):
+        return self.pos[:self.count]
+
+    @property
+    def velocities(self):
+        return self.vel[:self.count]
+
+    @property
+    def x(self):
+        return self.pos[:self.count, 0]
+
+    @property
+    def y(self):
+        return self.pos[:self.count, 1]
+
+    @property
+    def z(self):
+        return self.pos[:self.count, 2]
+
+    @property
+    def pressure_ratio(self):
+        return self._pressure_ratio[:self.count]
+
+    @property
+    def alpha(self):
+        return self._alpha[:self.count]
+
+    @property
+    def exiting(self):
+        return self._exiting[:self.count]
+
+    @property
+    def square_speed_sum(self):
+        # sum |v|^2 of the live particles, computed on first use and kept until a row change or
+        # velocities_changed(). Elastic collide() and the wall reflections in move() keep it
+        if self._square_speed_sum is None or self._square_speed_generation != self.generation:
+            vel = self.velocities
+            self._square_speed_sum = float(np.einsum('ij,ij->', vel, vel))
+            self._square_speed_generation = self.generation
+        return self._square_speed_sum
+
+    def velocities_changed(self, factor=None):
+        # Call after writing velocities outside collide() and move(); a uniform `factor` keeps the cached sum
+        if factor is not None and self._square_speed_sum is not None:
+            self._square_speed_sum *= factor * factor
+        else:
+            self._square_speed_sum = None
+
+    def add(self, positions, velocities, pressure_ratio=1.0, exiting=False, alpha=255):
+        positions = np.asarray(positions, dtype=float).reshape(-1, 3)
+        added = len(positions)
+        if added == 0:
+            return
+        if self.count + added > self.capacity:
+            capacity = self.capacity
+            while capacity < self.count + added:
+                capacity *= 2
+            self._allocate(capacity)
+
+        start, end = self.count, self.count + added
+        self.pos[start:end] = positions
+        self.vel[start:end] = velocities
+        self._pressure_ratio[start:end] = pressure_ratio
+        self._alpha[start:end] = alpha
+        self._exiting[start:end] = exiting
+        self.count = end
+        self.generation += 1
+
+    def take(self, indices):
+        # Copy of the selected rows, suitable for passing to another store's add()
+        return {
+            'positions': self.pos[indices].copy(),
+            'velocities': self.vel[indices].copy(),
+            'pressure_ratio': self._pressure_ratio[indices].copy(),
+            'exiting': self._exiting[indices].copy(),
+            'alpha': self._alpha[indices].copy(),
+        }
+
+    def keep(self, mask):
+        # Compact the store down to the rows where mask is True
+        indices = np.flatnonzero(mask)
+        n = len(indices)
+        self.pos[:n] = self.pos[indices]
+        self.vel[:n] = self.vel[indices]
+        self._pressure_ratio[:n] = self._pressure_ratio[indices]
+        self._alpha[:n] = self._alpha[indices]
+        self._exiting[:n] = self._exiting[indices]
+        self.count = n
+        self.generation += 1
+
+    def remove(self, indices):
+        mask = np.ones(self.count, dtype=bool)
+        mask[indices] = False
+        self.keep(mask)
+
+    def swap_remove(self, indices):
+        # O(k) removal of distinct rows: the last live rows are moved into the holes, so the
+        # order of the remaining particles is not kept
+        indices = np.asarray(indices, dtype=np.intp)
+        removed = len(indices)
+        if removed == 0:
+            return
+        end = self.count - removed
+        holes = indices[indices < end]
+        tail = np.ones(removed, dtype=bool)
+        tail[indices[indices >= end] - end] = False
+        movers = end + np.flatnonzero(tail)
+        for column in (self.pos, self.vel, self._pressure_ratio, self._alpha, self._exiting):
+            column[holes] = column[movers]
+        self.count = end
+        self.generation += 1
+
+    def clear(self):
+        self.count = 0
+        self.generation += 1
+
+    def bounds(self):
+        rect = self.container_rect
+        half_depth = rect.width / 2
+        lower = np.array([rect.left, rect.top, -half_depth], dtype=float)
+        upper = np.array([rect.right, rect.bottom, half_depth], dtype=float)
+        return lower, upper
+
+    def move(self):
+        # Integrate and reflect off the container walls; exiting particles are
+        # advanced separately by move_outward()
+        n = self.count
+        if n == 0:
+            return
+        moving = ~self._exiting[:n]
+        if moving.all():
+            pos = self.pos[:n]
+            vel = self.vel[:n]
+            pos += vel
+            self._reflect(pos, vel)
+        else:
+            indices = np.flatnonzero(moving)
+            pos = self.pos[indices]
+            vel = self.vel[indices]
+            pos += vel
+            self._reflect(pos, vel)
+            self.pos[indices] = pos
+            self.vel[indices] = vel
+
+    def _reflect(self, pos, vel):
+        lower, upper = self.bounds()
+        below = pos <= lower
+        above = pos >= upper
+        # Only the few rows at a wall are gathered: each flip of an inward-moving
+        # component hands 2|v| to that wall
+        for side, hits, sign in ((0, below, -1.0), (1, above, 1.0)):
+            rows, axes = np.nonzero(hits)
+            if len(rows):
+                transfer = np.maximum(sign * vel[rows, axes], 0.0) * 2
+                self.wall_impulse[side] += np.bincount(axes, weights=transfer, minlength=3)
+        np.copyto(vel, np.abs(vel), where=below)
+        np.copyto(vel, -np.abs(vel), where=above)
+        np.clip(pos, lower, upper, out=pos)
+
+    def move_outward(self):
+        n = self.count
+        if n == 0:
+            return
+        indices = np.flatnonzero(self._exiting[:n])
+        if len(indices) == 0:
+            return
+        self.pos[indices, :2] += self.vel[indices, :2] * 2
+        past_valve = self.pos[indices, 0] >= self.container_rect.right + 10
+        fading = indices[past_valve]
+        self._alpha[fading] = np.maximum(self._alpha[fading] - 5, 0)
+
+    def collide(self, first, second):
+        resolve_pairs(self.pos, self.vel, first, second)
@@ -0,0 +1,220 @@
+import json
+import os
+import numpy as np
+
+MAGIC = b'PSTRACE1'
+HEADER_SIZE = 4096  # Magic, step count, then the JSON layout, padded
+_COUNT = np.dtype('<i8')
+
+
+def chunk_dtype(fields, rows, particles):
+    # One chunk holds `rows` consecutive steps of scalar fields plus, for particle traces,
+    # one particle keyframe taken at the first of those steps. Positions are quantized to
+    # 16 bits across the frame's bounds and velocities stored as half floats.
+    layout = [('scalars', np.dtype(fields), (rows,))]
+    if particles:
+        layout += [
+            ('count', '<i4'),
+            ('stride', '<i4'),
+            ('lower', '<f4', (3,)),
+            ('upper', '<f4', (3,)),
+            ('positions', '<u2', (particles, 3)),
+            ('velocities', '<f2', (particles, 3)),
+        ]
+    return np.dtype(layout)
+
+
+def _descr(dtype):
+    return [(name, dtype[name].base.str, dtype[name].shape) for name in dtype.names]
+
+
+class TraceWriter:
+    # Append-only recording. The file is preallocated in whole chunks and doubled when full;
+    # records are written straight into a memory map, so appending never buffers the run.
+    # `rows` steps share one particle keyframe: set it to 1 to keep every step's particles.
+    def __init__(self, path, fields, rows=1024, particles=0, capacity=16, metadata=None):
+        self.path = path
+        self.fields = np.dtype(fields)
+        self.rows = rows
+        self.particles = particles
+        self.dtype = chunk_dtype(self.fields, rows, particles)
+        self.steps = 0
+        layout = {
+            'fields': _descr(self.fields),
+            'rows': rows,
+            'particles': particles,
+            'metadata': metadata or {},
+        }
+        header = json.dumps(layout).encode()
+        if len(header) > HEADER_SIZE - len(MAGIC) - _COUNT.itemsize:
+            raise ValueError("trace metadata does not fit in the header")
+
+        self._file = open(path, 'w+b')
+        self._file.write(MAGIC + np.zeros(1, _COUNT).tobytes() + header)
+        self._file.truncate(HEADER_SIZE)
+        # The header's step count is mapped too and kept current by append(), so a recording
+        # that is killed rather than closed still reads back every step it wrote
+        self._count = np.memmap(self._file, dtype=_COUNT, mode='r+', offset=len(MAGIC), shape=(1,))
+        self._capacity = 0
+        self._chunks = None
+        self._grow(max(capacity, 1))
+
+    def _grow(self, capacity):
+        if self._chunks is not None:
+            self._chunks.flush()
+            del self._chunks
+        self._file.truncate(HEADER_SIZE + capacity * self.dtype.itemsize)
+        self._chunks = np.memmap(self._file, dtype=self.dtype, mode='r+', offset=HEADER_SIZE, shape=(capacity,))
+        self._capacity = capacity
+
+    def append(self, values, positions=None, velocities=None, bounds=None):
+        # values: a tuple in field order. Particle arrays are only read at keyframe steps.
+        chunk, row = divmod(self.steps, self.rows)
+        if chunk >= self._capacity:
+            self._grow(2 * self._capacity)
+        record = self._chunks[chunk]
+        record['scalars'][row] = values
+        if self.particles and row == 0 and positions is not None:
+            self._keyframe(record, positions, velocities, bounds)
+        self.steps += 1
+        self._count[0] = self.steps
+
+    def needs_keyframe(self):
+        # True when the next append() will store particles; lets callers skip gathering them
+        return self.particles > 0 and self.steps % self.rows == 0
+
+    def _keyframe(self, record, positions, velocities, bounds):
+        # More particles than slots are decimated to every stride-th one
+        count = len(positions)
+        stride = max(1, -(-count // self.particles))
+        positions = positions[::stride]
+        velocities = velocities[::stride]
+        lower, upper = bounds
+        extent = np.maximum(np.asarray(upper) - np.asarray(lower), 1e-9)
+        kept = len(positions)
+        record['count'] = kept
+        record['stride'] = stride
+        record['lower'] = lower
+        record['upper'] = upper
+        record['positions'][:kept] = np.round(np.clip((positions - lower) / extent, 0, 1) * 65535)
+        record['velocities'][:kept] = velocities
+
+    def flush(self):
+        self._chunks.flush()
+        self._count.flush()
+
+    def close(self):
+        if self._file.closed:
+            return
+        self.flush()
+        del self._chunks
+        del self._count
+        # Drop the unused preallocated tail
+        used = -(-self.steps // self.rows)
+        self._file.truncate(HEADER_SIZE + used * self.dtype.itemsize)
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+class _Column:
+    # Sequence view of one scalar field across chunks, read lazily (for bisect)
+    def __init__(self, reader, name):
+        self.reader = reader
+        self.name = name
+
+    def __len__(self):
+        return len(self.reader)
+
+    def __getitem__(self, step):
+        chunk, row = divmod(step, self.reader.rows)
+        return self.reader.chunks[chunk]['scalars'][row][self.name]
+
+
+class TraceReader:
+    # Memory-mapped view of a trace; nothing is read until a step or range is asked for
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            head = f.read(HEADER_SIZE)
+        if not head.startswith(MAGIC):
+            raise ValueError(f"{path} is not a trace file")
+        self.steps = int(np.frombuffer(head, _COUNT, 1, len(MAGIC))[0])
+        layout = json.loads(head[len(MAGIC) + _COUNT.itemsize:].rstrip(b'\0').decode())
+        self.fields = np.dtype([(name, base, tuple(shape)) for name, base, shape in layout['fields']])
+        self.rows = layout['rows']
+        self.particles = layout['particles']
+        self.metadata = layout['metadata']
+        self.dtype = chunk_dtype(self.fields, self.rows, self.particles)
+        chunks = (os.path.getsize(path) - HEADER_SIZE) // self.dtype.itemsize
+        self.chunks = np.memmap(path, dtype=self.dtype, mode='r', offset=HEADER_SIZE, shape=(chunks,))
+        self.steps = min(self.steps, chunks * self.rows)
+
+    def __len__(self):
+        return self.steps
+
+    def step(self, step):
+        if not 0 <= step < self.steps:
+            raise IndexError(step)
+        chunk, row = divmod(step, self.rows)
+        return self.chunks[chunk]['scalars'][row]
+
+    def column(self, name, start=0, stop=None, every=1):
+        # One field over [start, stop), reading only the chunks that range covers
+        stop = self.steps if stop is None else min(stop, self.steps)
+        first, last = start // self.rows, -(-stop // self.rows)
+        values = self.chunks[first:last]['scalars'][name].reshape((-1,) + self.fields[name].shape)
+        offset = first * self.rows
+        return values[start - offset:stop - offset:every]
+
+    def find(self, name, value):
+        # First step whose (non-decreasing) field reaches value, by binary search on the map
+        column = _Column(self, name)
+        low, high = 0, len(column)
+        while low < high:
+            middle = (low + high) // 2
+            if column[middle] < value:
+                low = middle + 1
+            else:
+                high = middle
+        return min(low, self.steps - 1)
+
+    def keyframe_step(self, step):
+        # The step of the particle keyframe at or before `step`
+        return (step // self.rows) * self.rows
+
+    def keyframe(self, step):
+        # Positions and velocities of the keyframe at or before `step`, plus the decimation stride
+        record = self.chunks[step // self.rows]
+        count = int(record['count'])
+        lower = record['lower'].astype(float)
+        upper = record['upper'].astype(float)
+        positions = record['positions'][:count] / 65535.0 * (upper - lower) + lower
+        velocities = record['velocities'][:count].astype(float)
+        return positions, velocities, int(record['stride'])
+
+
+def engine_fields(cylinders):
+    # Cycle angle is in [0, 4*pi); sound_phase is the audio thread's own cycle angle
+    return [('step', '<i8'), ('time', '<f8'), ('theta', '<f8'), ('cycle_angle', '<f8'), ('rpm', '<f4'),
+            ('pressure', '<f4', (cylinders,)), ('sound_phase', '<f4')]
+
+
+GAS_FIELDS = [('step', '<i8'), ('time', '<f8'), ('volume', '<f8'), ('temperature', '<f8'), ('mass', '<f8'),
+              ('pressure', '<f8'), ('measured_pressure', '<f4'), ('measured_temperature', '<f4'),
+              ('particles', '<i4'), ('weight', '<f4')]
+
+
+def record_gas(writer, step, time, gas_sim, ui):
+    # One GAS_FIELDS row; particles are only gathered when the row starts a keyframe
+    store = ui.particles
+    values = (step, time, gas_sim.volume, gas_sim.temperature, gas_sim.mass, gas_sim.pressure,
+              ui.gauge.measured_pressure, ui.gauge.measured_temperature, store.count, store.weight)
+    if writer.needs_keyframe():
+        writer.append(values, store.positions, store.velocities, store.bounds())
+    else:
+        writer.append(values)
@@ -0,0 +1,81 @@
+import numpy as np
+import pygame
+
+
+class ParticleRenderer:
+    # Draws a whole ParticleStore per call. Sprites are pre-rendered once per alpha level
+    # and depth bucket and submitted in a single Surface.blits call; above
+    # `pixel_threshold` particles the opaque ones are written straight into the pixel array.
+    def __init__(self, color=(0, 0, 255), radius=2, alpha_step=5, depth_buckets=1, pixel_threshold=20000):
+        self.color = color
+        self.radius = radius
+        self.alpha_step = alpha_step  # Exiting particles fade in steps of 5, so levels are exact
+        self.depth_buckets = depth_buckets
+        self.pixel_threshold = pixel_threshold
+        self._sprites = {}
+
+    def sprite(self, alpha_level, depth_bucket=0):
+        key = (alpha_level, depth_bucket)
+        sprite = self._sprites.get(key)
+        if sprite is None:
+            color = self.shaded_color(depth_bucket)
+            alpha = min(255, alpha_level * self.alpha_step)
+            size = self.radius * 2
+            sprite = pygame.Surface((size, size), pygame.SRCALPHA)
+            pygame.draw.circle(sprite, color + (alpha,), (self.radius, self.radius), self.radius)
+            self._sprites[key] = sprite
+        return sprite
+
+    def shaded_color(self, depth_bucket):
+        # Far particles are drawn darker when depth shading is enabled
+        shade = 1.0 - 0.6 * depth_bucket / max(self.depth_buckets - 1, 1)
+        return tuple(int(c * shade) for c in self.color)
+
+    def depth_bucket(self, store):
+        if self.depth_buckets <= 1:
+            return np.zeros(store.count, dtype=np.intp)
+        half_depth = store.container_rect.width / 2
+        # Nearest particles (positive z) get bucket 0
+        relative = (half_depth - store.z) / max(2 * half_depth, 1)
+        return np.clip((relative * self.depth_buckets).astype(np.intp), 0, self.depth_buckets - 1)
+
+    def draw(self, screen, store):
+        if store.count == 0:
+            return
+        visible = store.alpha > 0
+        if store.count >= self.pixel_threshold:
+            opaque = visible & (store.alpha >= 255)
+            self.draw_pixels(screen, store, opaque)
+            visible &= ~opaque
+
+        indices = np.flatnonzero(visible)
+        if len(indices) == 0:
+            return
+        levels = (store.alpha[indices] + self.alpha_step - 1) // self.alpha_step
+        buckets = self.depth_bucket(store)[indices]
+        xs = store.x[indices].astype(np.intp).tolist()
+        ys = store.y[indices].astype(np.intp).tolist()
+
+        sprite = self.sprite
+        screen.blits([(sprite(level, bucket), (x, y))
+                      for level, bucket, x, y in zip(levels.tolist(), buckets.tolist(), xs, ys)], doreturn=False)
+
+    def draw_pixels(self, screen, store, mask):
+        # Direct writes skip per-particle blending; each particle covers a 2x2 block
+        width, height = screen.get_size()
+        xs = store.x[mask].astype(np.intp) + self.radius - 1
+        ys = store.y[mask].astype(np.intp) + self.radius - 1
+        buckets = self.depth_bucket(store)[mask]
+        mapped = np.array([screen.map_rgb(self.shaded_color(bucket)) for bucket in range(max(self.depth_buckets, 1))],
+                          dtype=np.uint32)
+
+        pixels = pygame.surfarray.pixels2d(screen)
+        try:
+            for offset_x in (0, 1):
+                for offset_y in (0, 1):
+                    px = xs + offset_x
+                    py = ys + offset_y
+                    inside = (px >= 0) & (px < width) & (py >= 0) & (py < height)
+                    pixels[px[inside], py[inside]] = mapped[buckets[inside]]
+        finally:
+            del pixels
@@ -0,0 +1,136 @@
+import os
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+from particles import resolve_pairs
+
+# Every candidate pair is anchored at the lower corner of the 2x2 block of cells that
+# holds both particles. Anchors that share a colour are at least two cells apart in
+# at least one direction, so their blocks never share a particle and can run concurrently.
+COLORINGS = {
+    'checkerboard': 2,  # 4 colours, 2x2 blocks
+    'nine': 3,          # 9 colours, 3x3 spacing for extra margin
+}
+
+_attached = {}  # Shared-memory blocks a worker process has mapped, keyed by name
+
+
+def _resolve_shared(name, capacity, first, second):
+    block = _attached.get(name)
+    if block is None:
+        for stale in _attached.values():
+            stale.close()
+        _attached.clear()
+        block = shared_memory.SharedMemory(name=name)
+        _attached[name] = block
+    state = np.ndarray((2, capacity, 3), dtype=np.float64, buffer=block.buf)
+    resolve_pairs(state[0], state[1], first, second)
+
+
+class CollisionScheduler:
+    def __init__(self, backend='serial', workers=None, coloring='checkerboard'):
+        if backend not in ('serial', 'thread', 'process'):
+            raise ValueError(f"Unknown collision backend: {backend}")
+        if coloring not in COLORINGS:
+            raise ValueError(f"Unknown cell coloring: {coloring}")
+        # Thread workers mostly wait on the GIL (slower than serial in headless runs), hence the default
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if backend == 'process':
+            workers = min(workers, os.cpu_count() or 1)
+        self.backend = backend
+        self.workers = max(1, workers)
+        self.coloring = coloring
+        self.executor = None
+        self._shared = None
+        self._shared_capacity = 0
+
+        if backend == 'thread':
+            self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        elif backend == 'process':
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+
+    def phases(self, first, second, grid_x, grid_y):
+        # Group the pairs by colour, then split each colour into at most `workers` chunks
+        # whose boundaries fall between anchors. Pair order inside an anchor is preserved.
+        period = COLORINGS[self.coloring]
+        anchor_x = np.minimum(grid_x[first], grid_x[second])
+        anchor_y = np.minimum(grid_y[first], grid_y[second])
+        anchor_x -= anchor_x.min()
+        anchor_y -= anchor_y.min()
+        color = (anchor_x % period) * period + anchor_y % period
+        anchor = anchor_x * (anchor_y.max() + 1) + anchor_y
+
+        order = np.lexsort((anchor, color))
+        first = first[order]
+        second = second[order]
+        color = color[order]
+        anchor = anchor[order]
+
+        color_bounds = np.flatnonzero(np.diff(color)) + 1
+        color_starts = np.concatenate(([0], color_bounds))
+        color_ends = np.concatenate((color_bounds, [len(color)]))
+
+        for start, end in zip(color_starts, color_ends):
+            # Snap evenly spaced cut points forward to the next anchor boundary
+            anchor_starts = np.flatnonzero(np.diff(anchor[start:end])) + 1 + start
+            targets = start + (end - start) * np.arange(1, self.workers) // self.workers
+            snapped = np.searchsorted(anchor_starts, targets)
+            cuts = np.unique(anchor_starts[snapped[snapped < len(anchor_starts)]])
+            bounds = np.concatenate(([start], cuts, [end]))
+            yield [(first[a:b], second[a:b]) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+    def resolve(self, store, first, second, grid_x, grid_y):
+        if len(first) == 0:
+            return
+        phases = self.phases(first, second, grid_x, grid_y)
+
+        if self.backend == 'serial':
+            for chunks in phases:
+                for chunk_first, chunk_second in chunks:
+                    resolve_pairs(store.pos, store.vel, chunk_first, chunk_second)
+            return
+
+        if self.backend == 'thread':
+            for chunks in phases:
+                futures = [self.executor.submit(resolve_pairs, store.pos, store.vel, a, b) for a, b in chunks]
+                self._barrier(futures)
+            return
+
+        # Process backend: mirror positions and velocities into shared memory for the step
+        n = store.count
+        state = self._shared_state(store.capacity)
+        state[0, :n] = store.pos[:n]
+        state[1, :n] = store.vel[:n]
+        for chunks in phases:
+            futures = [self.executor.submit(_resolve_shared, self._shared.name, self._shared_capacity, a, b)
+                       for a, b in chunks]
+            self._barrier(futures)
+        store.pos[:n] = state[0, :n]
+        store.vel[:n] = state[1, :n]
+
+    def _barrier(self, futures):
+        # All chunks of a colour must finish before the next colour may touch their particles
+        wait(futures)
+        for future in futures:
+            future.result()
+
+    def _shared_state(self, capacity):
+        if self._shared is None or self._shared_capacity < capacity:
+            self._release_shared()
+            self._shared = shared_memory.SharedMemory(create=True, size=2 * capacity * 3 * 8)
+            self._shared_capacity = capacity
+        return np.ndarray((2, self._shared_capacity, 3), dtype=np.float64, buffer=self._shared.buf)
+
+    def _release_shared(self):
+        if self._shared is not None:
+            self._shared.close()
+            self._shared.unlink()
+            self._shared = None
+            self._shared_capacity = 0
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+        self._release_shared()
@@ -0,0 +1,100 @@
+import queue
+import threading
+import time
+
+
+class SnapshotBuffer:
+    # Latest-value hand-over between a simulation thread and a render thread. The writer
+    # fills back(), then publish() makes it the front; the reader's acquire() returns the
+    # newest front and keeps it until its next acquire(). A third slot means the writer
+    # always has a slot that is neither published nor being read, so neither side waits
+    # and a snapshot never changes while the reader holds it.
+    def __init__(self, factory, slots=3):
+        self._slots = [factory() for _ in range(max(slots, 3))]
+        self._lock = threading.Lock()
+        self._back = 0
+        self._front = None
+        self._reading = None
+        self.published = 0
+
+    def back(self):
+        return self._slots[self._back]
+
+    def publish(self):
+        with self._lock:
+            self._front = self._back
+            self.published += 1
+            self._back = next(index for index in range(len(self._slots)) if index not in (self._front, self._reading))
+
+    def acquire(self):
+        # None until the first publish()
+        with self._lock:
+            self._reading = self._front
+            return None if self._front is None else self._slots[self._front]
+
+
+class SimulationWorker:
+    # Calls step() on its own thread, at most `rate` times a second (None: as fast as it can),
+    # and publishes capture(slot) into `buffer` after each step. Anything that changes the
+    # simulation from another thread goes through submit(), which runs it between steps.
+    def __init__(self, step, capture, buffer, rate=None):
+        self.step = step
+        self.capture = capture
+        self.buffer = buffer
+        self.rate = rate
+        self.steps = 0
+        self.steps_per_second = 0.0
+        self.error = None
+        self._commands = queue.SimpleQueue()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='simulation', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def submit(self, func, *args):
+        self._commands.put((func, args))
+
+    def _run_commands(self):
+        while True:
+            try:
+                func, args = self._commands.get_nowait()
+            except queue.Empty:
+                return
+            func(*args)
+
+    def _run(self):
+        period = 1.0 / self.rate if self.rate else 0.0
+        next_step = time.perf_counter()
+        window_start, window_steps = next_step, 0
+        try:
+            while not self._stop.is_set():
+                self._run_commands()
+                self.step()
+                self.capture(self.buffer.back())
+                self.buffer.publish()
+                self.steps += 1
+                window_steps += 1
+
+                now = time.perf_counter()
+                if now - window_start >= 1.0:
+                    self.steps_per_second = window_steps / (now - window_start)
+                    window_start, window_steps = now, 0
+                if period:
+                    next_step += period
+                    if next_step > now:
+                        self._stop.wait(next_step - now)
+                    else:
+                        next_step = now  # Running behind: carry on at full speed rather than bunch up steps
+        except Exception as exc:
+            self.error = exc
+
+    def check(self):
+        # Re-raise a failure of the simulation thread on the caller's thread
+        if self.error is not None:
+            raise RuntimeError("simulation thread failed") from self.error
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+from gas import GasSimulation, IdealGas, TabulatedEOS, VanDerWaals
+
+EQUATIONS = {
+    'ideal': IdealGas(),
+    'van der waals': VanDerWaals(),
+    'tabulated': TabulatedEOS.from_eos(IdealGas(), np.linspace(100, 1000, 19), np.geomspace(1e-3, 10, 41)),
+}
+
+
+@pytest.mark.parametrize('name', EQUATIONS)
+def test_scalar_state_gives_float_pressure(name):
+    sim = GasSimulation(0.1, 300.0, 1.0, eos=EQUATIONS[name])
+    assert type(sim.pressure) is float
+    sim.change_temperature(50.0)
+    assert type(sim.pressure) is float
+    assert sim.pressure == pytest.approx(IdealGas().pressure(sim.calculate_moles(), 0.1, 350.0, sim.R), rel=0.05)
+    assert float(sim.calculate_temperature(sim.pressure)) == pytest.approx(350.0, rel=1e-6)
+
+
+@pytest.mark.parametrize('name', EQUATIONS)
+def test_array_state_gives_array_pressure(name):
+    sim = GasSimulation(0.1, 300.0, 1.0, eos=EQUATIONS[name])
+    pressures = sim.calculate_pressure(np.array([300.0, 350.0]))
+    assert isinstance(pressures, np.ndarray) and pressures.shape == (2,)
+    assert pressures[0] == pytest.approx(sim.pressure)
@@ -0,0 +1,60 @@
+import json
+import numpy as np
+import pytest
+from instrumentation import FRAME, FrameProfiler, PhaseTimer
+
+
+def test_phase_timer_keeps_the_last_capacity_samples():
+    timer = PhaseTimer(4)
+    assert timer.stats() is None
+    for seconds in range(1, 7):
+        timer.push(float(seconds))
+    stats = timer.stats()
+    assert stats['samples'] == 4
+    assert sorted(timer.samples) == [3.0, 4.0, 5.0, 6.0]
+    assert stats['max'] == 6.0
+    assert stats['mean'] == 4.5
+
+
+def test_percentiles_over_a_full_buffer():
+    timer = PhaseTimer(100)
+    for seconds in np.arange(1, 201) / 1000:
+        timer.push(seconds)
+    stats = timer.stats()
+    # Only 0.101 .. 0.200 s are left in the buffer
+    assert stats['p50'] == pytest.approx(np.percentile(np.arange(101, 201) / 1000, 50))
+    assert stats['p95'] == pytest.approx(0.19505)
+    assert stats['p99'] == pytest.approx(0.19901)
+    assert stats['p50'] <= stats['p95'] <= stats['p99'] <= stats['max']
+
+
+def test_phases_are_summed_per_frame(tmp_path):
+    path = tmp_path / 'phases.jsonl'
+    profiler = FrameProfiler(enabled=True, capacity=8, dump_path=path, dump_every=4)
+    for frame in range(5):
+        profiler.record('collisions', 0.001)
+        profiler.record('collisions', 0.002)
+        if frame % 2 == 0:
+            profiler.record('render', 0.004)
+        profiler.end_frame()
+
+    stats = profiler.stats()
+    assert stats['collisions']['samples'] == 5
+    assert stats['collisions']['max'] == pytest.approx(0.003)
+    # Frames without a render scope push a zero, so the phases stay aligned frame by frame
+    render = profiler.phases['render']
+    assert list(render.samples[:render.filled]) == pytest.approx([0.004, 0.0, 0.004, 0.0, 0.004])
+    # The first end_frame() only starts the wall clock
+    assert stats[FRAME]['samples'] == 4
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [record['frame'] for record in records] == [4]
+    assert set(records[0]['phases']) == {'collisions', 'render', FRAME}
+
+
+def test_disabled_profiler_records_nothing():
+    profiler = FrameProfiler()
+    with profiler.scope('collisions'):
+        pass
+    profiler.end_frame()
+    assert profiler.stats() == {}
+    assert profiler.frames == 0
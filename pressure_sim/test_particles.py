@@ -0,0 +1,87 @@
+import numpy as np
+import pygame
+import pytest
+from particles import PARTICLE_DIAMETER, ParticleStore, _resolve_each, resolve_pairs
+
+
+def labelled_store(count):
+    # Every column of row k encodes k, so a row that mixes two particles is detectable
+    store = ParticleStore(pygame.Rect(0, 0, 100, 100), capacity=4)
+    label = np.arange(count, dtype=float)
+    store.add(np.column_stack((label, label, label)), np.column_stack((-label, -label, -label)),
+              pressure_ratio=label, alpha=(np.arange(count) % 256).astype(np.uint8))
+    return store
+
+
+def check_rows(store, expected):
+    labels = store.positions[:, 0]
+    assert sorted(labels.tolist()) == sorted(expected)
+    assert np.array_equal(store.positions, np.column_stack((labels, labels, labels)))
+    assert np.array_equal(store.velocities, -store.positions)
+    assert np.array_equal(store.pressure_ratio, labels)
+    assert np.array_equal(store.alpha, labels.astype(int) % 256)
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_swap_remove_keeps_every_other_row_intact(seed):
+    rng = np.random.default_rng(seed)
+    count = int(rng.integers(1, 60))
+    store = labelled_store(count)
+    removed = rng.choice(count, size=int(rng.integers(0, count + 1)), replace=False)
+    generation = store.generation
+
+    store.swap_remove(removed)
+
+    assert store.count == count - len(removed)
+    check_rows(store, sorted(set(range(count)) - set(removed.tolist())))
+    assert store.generation == generation + (len(removed) > 0)
+
+
+def test_swap_remove_tail_and_everything():
+    store = labelled_store(10)
+    store.swap_remove([9, 8, 7])
+    check_rows(store, list(range(7)))
+    store.swap_remove(np.arange(7))
+    assert store.count == 0
+
+
+@pytest.mark.parametrize('side', [6.0, 12.0, 40.0])
+def test_resolve_pairs_matches_one_by_one(side):
+    # Crowded boxes put most particles in many near pairs, so the rounds are long and uneven
+    rng = np.random.default_rng(int(side))
+    count = 300
+    pos = rng.uniform(0, side, (count, 3))
+    vel = rng.normal(0, 1, (count, 3))
+    first, second = np.triu_indices(count, 1)
+    shuffle = rng.permutation(len(first))
+    first, second = first[shuffle], second[shuffle]
+    delta = pos[first] - pos[second]
+    near = np.einsum('ij,ij->i', delta, delta) < PARTICLE_DIAMETER ** 2
+
+    expected_pos, expected_vel = pos.copy(), vel.copy()
+    _resolve_each(expected_pos, expected_vel, first[near].tolist(), second[near].tolist())
+    resolve_pairs(pos, vel, first, second)
+
+    assert np.allclose(pos, expected_pos, rtol=0, atol=1e-9)
+    assert np.allclose(vel, expected_vel, rtol=0, atol=1e-9)
+
+
+def test_square_speed_sum_survives_collisions_and_moves():
+    rng = np.random.default_rng(1)
+    store = ParticleStore(pygame.Rect(0, 0, 20, 20))
+    store.add(rng.uniform(0, 20, (200, 3)), rng.normal(0, 1, (200, 3)))
+    cached = store.square_speed_sum
+    for _ in range(20):
+        first, second = np.triu_indices(store.count, 1)
+        store.collide(first, second)
+        store.move()
+    assert store.square_speed_sum is cached
+    vel = store.velocities
+    assert cached == pytest.approx(float(np.einsum('ij,ij->', vel, vel)), rel=1e-12)
+
+    store.velocities[:] *= 2.0
+    store.velocities_changed(2.0)
+    assert store.square_speed_sum == pytest.approx(4.0 * cached, rel=1e-12)
+    store.velocities[0] = 0.0
+    store.velocities_changed()
+    assert store.square_speed_sum == pytest.approx(float(np.einsum('ij,ij->', vel, vel)), rel=1e-12)
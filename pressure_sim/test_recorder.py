@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+from recorder import GAS_FIELDS, TraceReader, TraceWriter
+
+ROWS = 4
+PARTICLES = 8
+
+
+def values(step):
+    return (step, step / 60, 10.0 + step, 300.0, 10.0, 1e5 + step, 9e4, 299.0, PARTICLES, 1.0)
+
+
+def particles(step):
+    rng = np.random.default_rng(step)
+    return rng.uniform(0, 100, (PARTICLES, 3)), rng.normal(0, 1, (PARTICLES, 3))
+
+
+def write(path, steps, close=True):
+    writer = TraceWriter(str(path), GAS_FIELDS, rows=ROWS, particles=PARTICLES, capacity=1, metadata={'source': 'test'})
+    for step in range(steps):
+        if writer.needs_keyframe():
+            positions, velocities = particles(step)
+            writer.append(values(step), positions, velocities, (np.zeros(3), np.full(3, 100.0)))
+        else:
+            writer.append(values(step))
+    if close:
+        writer.close()
+    return writer
+
+
+@pytest.mark.parametrize('steps', [1, ROWS, 3 * ROWS + 1])
+def test_round_trip(tmp_path, steps):
+    path = tmp_path / 'run.trace'
+    write(path, steps)
+    reader = TraceReader(str(path))
+
+    assert len(reader) == steps
+    assert reader.metadata == {'source': 'test'}
+    for step in range(steps):
+        assert reader.step(step).item() == pytest.approx(values(step))
+    assert np.array_equal(reader.column('step'), np.arange(steps))
+    assert reader.find('time', (steps - 1) / 60) == steps - 1
+
+    for keyframe in range(0, steps, ROWS):
+        positions, velocities, stride = reader.keyframe(keyframe + ROWS - 1)
+        expected_positions, expected_velocities = particles(keyframe)
+        assert stride == 1
+        assert np.allclose(positions, expected_positions, atol=100 / 65535)  # 16-bit positions
+        assert np.allclose(velocities, expected_velocities, rtol=1e-3, atol=1e-3)  # Half-float velocities
+
+
+def test_unclosed_recording_keeps_its_steps(tmp_path):
+    # As after a killed process: the header count is current even though close() never ran
+    path = tmp_path / 'run.trace'
+    writer = write(path, 2 * ROWS + 1, close=False)
+    reader = TraceReader(str(path))
+    assert len(reader) == 2 * ROWS + 1
+    assert reader.step(2 * ROWS)['step'] == 2 * ROWS
+    writer.close()
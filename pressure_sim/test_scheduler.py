@@ -0,0 +1,38 @@
+import numpy as np
+import pygame
+import pytest
+from broadphase import CellList
+from particles import ParticleStore, thermal_velocities
+from scheduler import CollisionScheduler
+
+
+def crowded_store(seed=0, count=1500):
+    # Dense enough that most cells hold several overlapping pairs
+    rng = np.random.default_rng(seed)
+    store = ParticleStore(pygame.Rect(300, 200, 100, 100))
+    positions = np.column_stack((rng.uniform(300, 400, count), rng.uniform(200, 300, count), rng.uniform(-50, 50, count)))
+    store.add(positions, thermal_velocities(rng, count, 300))
+    return store
+
+
+def run(backend, steps=5, coloring='checkerboard'):
+    store = crowded_store()
+    cells = CellList()
+    scheduler = CollisionScheduler(backend=backend, workers=4, coloring=coloring)
+    try:
+        for _ in range(steps):
+            first, second, grid_x, grid_y = cells.update(store, store.container_rect)
+            scheduler.resolve(store, first, second, grid_x, grid_y)
+            store.move()
+    finally:
+        scheduler.close()
+    return store.positions.copy(), store.velocities.copy()
+
+
+@pytest.mark.parametrize('coloring', ['checkerboard', 'nine'])
+@pytest.mark.parametrize('backend', ['thread', 'process'])
+def test_backends_match_serial_bit_for_bit(backend, coloring):
+    positions, velocities = run('serial', coloring=coloring)
+    other_positions, other_velocities = run(backend, coloring=coloring)
+    assert np.array_equal(positions, other_positions)
+    assert np.array_equal(velocities, other_velocities)
@@ -0,0 +1,26 @@
+import numpy as np
+import pygame
+import pytest
+from particles import ParticleStore, thermal_velocities
+from thermostat import Thermostat, store_temperature
+
+
+def warm_store(rng, count=200, temperature=300):
+    store = ParticleStore(pygame.Rect(0, 0, 100, 100))
+    store.add(rng.uniform(0, 100, (count, 3)), thermal_velocities(rng, count, temperature))
+    return store
+
+
+@pytest.mark.parametrize('mode', ['instant', 'berendsen', 'andersen'])
+def test_recovers_from_zero_kelvin(mode):
+    rng = np.random.default_rng(0)
+    store = warm_store(rng)
+    # One frame per time constant and a collision probability of ~1 make every mode reach its target in one update
+    thermostat = Thermostat(mode, tau=1.0, collision_rate=50.0)
+
+    thermostat.update(store, 0, rng)
+    assert store_temperature(store) == 0.0
+
+    thermostat.update(store, 300, rng)
+    assert store_temperature(store) == pytest.approx(300, rel=0.2)
+    assert np.count_nonzero(np.linalg.norm(store.velocities, axis=1)) == store.count
@@ -0,0 +1,57 @@
+from collections import OrderedDict
+import pygame
+
+
+class TextCache:
+    # Rendered text surfaces keyed on (font, text, color, antialias), evicting the least
+    # recently used beyond `maxsize`. Callers must not draw onto the returned surfaces.
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._surfaces = OrderedDict()
+
+    def __len__(self):
+        return len(self._surfaces)
+
+    def render(self, font, text, antialias, color):
+        # Same arguments as Font.render, with the font first
+        key = (font, text, tuple(color), antialias)
+        surface = self._surfaces.get(key)
+        if surface is not None:
+            self._surfaces.move_to_end(key)
+            self.hits += 1
+            return surface
+        self.misses += 1
+        surface = font.render(text, antialias, color)
+        self._surfaces[key] = surface
+        if len(self._surfaces) > self.maxsize:
+            self._surfaces.popitem(last=False)
+        return surface
+
+    def clear(self):
+        self._surfaces.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._surfaces),
+                'hit_rate': self.hits / lookups if lookups else 0.0}
+
+
+# Shared by the UI modules so identical labels are rendered once
+text_cache = TextCache()
+
+
+_fonts = {}
+
+
+def font(size, name=None):
+    # Fonts are loaded on first use and shared. name=None is pygame's bundled default font,
+    # which is what SysFont(None) ends up with too, minus its scan of the installed fonts.
+    key = (name, size)
+    loaded = _fonts.get(key)
+    if loaded is None:
+        if not pygame.font.get_init():
+            pygame.font.init()
+        loaded = _fonts[key] = pygame.font.Font(name, size)
+    return loaded
@@ -0,0 +1,82 @@
+import math
+import numpy as np
+from particles import SPEED_SQUARE_FACTOR, kinetic_temperature, thermal_velocities
+
+MODES = ('instant', 'berendsen', 'andersen')
+
+
+def store_temperature(store):
+    # Kinetic temperature of the live particles, in the same units as GasSimulation.temperature
+    if store.count == 0:
+        return 0.0
+    return kinetic_temperature(store.square_speed_sum / store.count)
+
+
+def scale(store, factor, dynamics=None):
+    # Multiply every velocity by `factor`; an EventDrivenGas passed as `dynamics` rescales its
+    # queued events along with them instead of rebuilding at its next advance
+    if dynamics is not None:
+        dynamics.rescale(store, factor)
+    else:
+        store.velocities[:] *= factor
+        store.velocities_changed(factor)
+
+
+def reseed(store, temperature, rng):
+    # Give every particle a fresh thermal velocity at exactly `temperature`. Velocities at
+    # 0 K have nothing left to scale; an EventDrivenGas picks the new ones up at its next advance
+    store.velocities[:] = thermal_velocities(rng, store.count, temperature, angle_offset=rng.uniform(0, 2 * math.pi))
+    store.velocities_changed()
+    rescale(store, temperature)
+
+
+def rescale(store, target, current=None, dynamics=None, rng=None):
+    # Scale every velocity by one factor so the kinetic temperature becomes `target`;
+    # directions, positions and the shape of the speed distribution are kept. A store at
+    # 0 K is reseeded instead when an `rng` is given
+    current = store_temperature(store) if current is None else current
+    if current > 0:
+        scale(store, math.sqrt(max(target, 0.0) / current), dynamics)
+    elif target > 0 and rng is not None:
+        reseed(store, target, rng)
+
+
+class Thermostat:
+    # Couples the particles to GasSimulation.temperature, one vectorized operation per frame.
+    #   instant    rescale once whenever the target changes
+    #   berendsen  relax toward the target with time constant `tau` frames (weak coupling)
+    #   andersen   give each particle a fresh Maxwell velocity at `collision_rate` per frame
+    # Berendsen keeps the velocity directions; Andersen thermalizes the distribution itself.
+    # Pass the EventDrivenGas in use as `dynamics` so a uniform rescale keeps its event queue;
+    # the few particles Andersen re-aims are re-predicted one by one at its next advance.
+    def __init__(self, mode='instant', tau=30.0, collision_rate=0.02):
+        if mode not in MODES:
+            raise ValueError(f"unknown thermostat mode {mode!r}")
+        self.mode = mode
+        self.tau = tau
+        self.collision_rate = collision_rate
+        self.target = None
+
+    def update(self, store, target, rng, frames=1.0, dynamics=None):
+        changed = target != self.target
+        self.target = target
+        if store.count == 0:
+            return
+        if self.mode == 'instant':
+            if changed:
+                rescale(store, target, dynamics=dynamics, rng=rng)
+        elif self.mode == 'berendsen':
+            current = store_temperature(store)
+            coupling = min(frames / self.tau, 1.0)
+            if current > 0:
+                scale(store, math.sqrt(1.0 + coupling * (target / current - 1.0)), dynamics)
+            elif target > 0:
+                # One relaxation step from 0 K lands at coupling * target
+                reseed(store, coupling * target, rng)
+        else:
+            probability = 1.0 - math.exp(-self.collision_rate * frames)
+            hit = np.flatnonzero(rng.random(store.count) < probability)
+            # Each component is normal with <v_i^2> = <|v|^2> / 3 at the target temperature
+            sigma = math.sqrt(max(target, 0.0) * SPEED_SQUARE_FACTOR / 100.0 / 3.0)
+            store.vel[hit] = rng.normal(0.0, sigma, (len(hit), 3))
+            store.velocities_changed()
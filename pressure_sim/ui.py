@@ -1,129 +1,42 @@
-import random
-import math
+import time
+import numpy as np
 import pygame
-from concurrent.futures import ThreadPoolExecutor
-from collections import defaultdict
-
-class Particle:
-    def __init__(self, x, y, z, container_rect, temperature, pressure_ratio=1.0, angle_offset=0):
-        self.x = x
-        self.y = y
-        self.z = z
-        self.container_rect = container_rect
-        self.temperature = temperature
-        self.angle_offset = angle_offset
-        self.pressure_ratio = pressure_ratio
-        self.alpha = 255  # Start fully opaque
-        self.exiting = False  # Track if the particle is exiting the container
-        self.set_velocity()
-
-    def set_velocity(self):
-        speed = math.sqrt(self.temperature / 100.0) * self.pressure_ratio
-        angle_xy = random.uniform(-math.pi / 6, math.pi / 6) + self.angle_offset
-        angle_z = random.uniform(-math.pi / 8, math.pi / 8)
-        self.vx = speed * math.cos(angle_xy)
-        self.vy = speed * math.sin(angle_xy)
-        self.vz = speed * math.sin(angle_z)
-
-    def update_velocity(self, new_temperature):
-        self.temperature = new_temperature
-        speed = math.sqrt(self.temperature / 100.0) * self.pressure_ratio
-        direction_xy = math.atan2(self.vy, self.vx)
-        direction_z = math.atan2(self.vz, math.sqrt(self.vx**2 + self.vy**2))
-        self.vx = speed * math.cos(direction_xy)
-        self.vy = speed * math.sin(direction_xy)
-        self.vz = speed * math.sin(direction_z)
-
-    def move(self):
-        if not self.exiting:
-            self.x += self.vx
-            self.y += self.vy
-            self.z += self.vz
-
-            if self.x <= self.container_rect.left:
-                self.vx = abs(self.vx)
-                self.x = self.container_rect.left
-            elif self.x >= self.container_rect.right:
-                self.vx = -abs(self.vx)
-                self.x = self.container_rect.right
-
-            if self.y <= self.container_rect.top:
-                self.vy = abs(self.vy)
-                self.y = self.container_rect.top
-            elif self.y >= self.container_rect.bottom:
-                self.vy = -abs(self.vy)
-                self.y = self.container_rect.bottom
-
-            container_depth = self.container_rect.width
-            if self.z <= -container_depth / 2:
-                self.vz = abs(self.vz)
-                self.z = -container_depth / 2
-            elif self.z >= container_depth / 2:
-                self.vz = -abs(self.vz)
-                self.z = container_depth / 2
-
-    def move_outward(self):
-        if self.exiting:
-            self.x += self.vx * 2
-            self.y += self.vy * 2
-            if self.x >= self.container_rect.right + 10:
-                self.alpha = max(self.alpha - 5, 0)
-
-    def collide_with(self, other):
-        dx = self.x - other.x
-        dy = self.y - other.y
-        dz = self.z - other.z
-        distance = math.sqrt(dx**2 + dy**2 + dz**2)
-        
-        if distance < 2.0:  # Assuming particles have a diameter of 2 units
-            overlap = 2.0 - distance
-            nx = dx / distance
-            ny = dy / distance
-            nz = dz / distance
-
-            self.x += nx * overlap / 2
-            self.y += ny * overlap / 2
-            self.z += nz * overlap / 2
-            other.x -= nx * overlap / 2
-            other.y -= ny * overlap / 2
-            other.z -= nz * overlap / 2
-
-            dvx = self.vx - other.vx
-            dvy = self.vy - other.vy
-            dvz = self.vz - other.vz
-
-            dot = dvx * nx + dvy * ny + dvz * nz
-
-            self.vx -= dot * nx
-            self.vy -= dot * ny
-            self.vz -= dot * nz
-            other.vx += dot * nx
-            other.vy += dot * ny
-            other.vz += dot * nz
-
-    def draw(self, screen):
-        if self.alpha > 0:
-            particle_surface = pygame.Surface((4, 4), pygame.SRCALPHA)
-            pygame.draw.circle(particle_surface, (0, 0, 255, self.alpha), (2, 2), 2)
-            screen.blit(particle_surface, (int(self.x), int(self.y)))
+from particles import ParticleStore, thermal_velocities
+from gas import GasSimulation
+from scheduler import CollisionScheduler
+from broadphase import CellList, NeighbourList
+from event_driven import EventDrivenGas
+from gauge import PressureGauge
+from governor import ParticleBudget
+from thermostat import Thermostat
+from render import ParticleRenderer
+from instrumentation import FrameProfiler
+from text_cache import font, text_cache
+
 
 class UIDiagnostics:
-    def __init__(self, gas_sim, clock):
+    def __init__(self, gas_sim, clock, seed=None, collision_backend='serial', workers=None, neighbour_skin=None, profiler=None, event_driven=False,
+                 frame_budget=None, thermostat='instant'):
         self.gas_sim = gas_sim
-        self.font = pygame.font.SysFont(None, 36)
-        self.fps_font = pygame.font.SysFont(None, 24)
+        self.profiler = profiler if profiler is not None else FrameProfiler()
+        self.step_profiler = self.profiler  # Times update(); a simulation thread gets its own
+        self.rng = np.random.default_rng(seed)
+        self.font = font(36)
+        self.fps_font = font(24)
         self.clock = clock
 
         self.container_rect = pygame.Rect(295, 195, 210, 210)
         self.inner_rect = pygame.Rect(300, 200, 200, 200)
 
-        self.particles = self.create_particles()
+        self.particles = ParticleStore(self.inner_rect)
+        self.particles.add(**self.create_particles())
 
         self.valve_left_rect = pygame.Rect(self.inner_rect.left - 10, self.inner_rect.centery - 15, 10, 30)
         self.valve_right_rect = pygame.Rect(self.inner_rect.right, self.inner_rect.centery - 15, 10, 30)
         self.valve_open = False
         self.valve_right_open = False
-        self.particles_moving_outward = []
+        self.particles_moving_outward = ParticleStore(self.inner_rect)
+        self.particle_renderer = ParticleRenderer()
 
         self.buttons = {
             'increase_volume': pygame.Rect(600, 100, 150, 40),
@@ -131,43 +44,62 @@ class UIDiagnostics:
             'increase_temp': pygame.Rect(600, 200, 150, 40),
             'decrease_temp': pygame.Rect(600, 250, 150, 40),
             'add_gas': pygame.Rect(600, 300, 150, 40),
-            'release_gas': pygame.Rect(600, 350, 150, 40)
+            'release_gas': pygame.Rect(600, 350, 150, 40),
+            'event_driven': pygame.Rect(600, 400, 150, 40)
         }
 
-        # Create a fixed ThreadPoolExecutor for the entire simulation
-        self.executor = ThreadPoolExecutor(max_workers=16)  # Using 16 workers as per your setup
+        # Colour-scheduled collision stage shared by the whole simulation
+        self.collisions = CollisionScheduler(backend=collision_backend, workers=workers)
+
+        # Persistent broad phase; cell size follows the particle diameter and the container,
+        # and with a skin the pair list is only rebuilt once particles have moved far enough
+        self.broad_phase = CellList() if neighbour_skin is None else NeighbourList(skin=neighbour_skin)
+
+        # Alternative engine for dilute gases: exact collision times instead of fixed steps
+        self.event_driven = EventDrivenGas() if event_driven else None
 
-        # Define the grid size for spatial partitioning
-        self.grid_size = 8  # Adjust this value based on your container size and performance needs
+        # Pressure and temperature measured from wall hits and particle speeds
+        self.gauge = PressureGauge()
+
+        # With a budget (seconds per particle step) particles are merged or split to stay near it
+        self.budget = ParticleBudget(frame_budget) if frame_budget is not None else None
+
+        # Velocities follow gas_sim.temperature in place, so a temperature change keeps the particles
+        self.thermostat = Thermostat(thermostat)
+        self.thermostat.target = self.gas_sim.temperature
 
     def create_particles(self, count=None, near_valve=False, pressure_ratio=1.0):
+        # Returns the columns for ParticleStore.add()
         if count is None:
-            moles = self.gas_sim.mass / 0.032
-            avogadro_number = 6.022e23
-            count = int(moles * avogadro_number * 1e-23)
+            count = self.particle_count(self.gas_sim.mass)
 
+        positions = np.empty((count, 3))
+        positions[:, 2] = self.rng.uniform(-self.inner_rect.width / 2, self.inner_rect.width / 2, count)
         if near_valve:
-            return [Particle(self.valve_left_rect.right, 
-                             self.valve_left_rect.centery,
-                             random.uniform(-self.inner_rect.width / 2, self.inner_rect.width / 2),
-                             self.inner_rect, self.gas_sim.temperature, 
-                             angle_offset=random.uniform(-0.2, 0.2), 
-                             pressure_ratio=pressure_ratio) for _ in range(count)]
+            positions[:, 0] = self.valve_left_rect.right
+            positions[:, 1] = self.valve_left_rect.centery
+            angle_offset = self.rng.uniform(-0.2, 0.2, count)
         else:
-            return [Particle(random.uniform(self.inner_rect.left, self.inner_rect.right),
-                             random.uniform(self.inner_rect.top, self.inner_rect.bottom),
-                             random.uniform(-self.inner_rect.width / 2, self.inner_rect.width / 2),
-                             self.inner_rect, self.gas_sim.temperature) for _ in range(count)]
+            positions[:, 0] = self.rng.uniform(self.inner_rect.left, self.inner_rect.right, count)
+            positions[:, 1] = self.rng.uniform(self.inner_rect.top, self.inner_rect.bottom, count)
+            angle_offset = 0.0
+            pressure_ratio = 1.0
+
+        velocities = thermal_velocities(self.rng, count, self.gas_sim.temperature, pressure_ratio, angle_offset)
+        return {'positions': positions, 'velocities': velocities, 'pressure_ratio': pressure_ratio}
+
+    def particle_count(self, mass):
+        # Particles needed for `mass` at the current particle weight
+        moles = mass / 0.032
+        avogadro_number = 6.022e23
+        return int(moles * avogadro_number * 1e-23 / self.particles.weight)
 
     def add_gas_via_valve(self, mass):
         self.valve_open = True
         pressure_ratio = 2.0
-        moles = mass / 0.032
-        avogadro_number = 6.022e23
-        count = int(moles * avogadro_number * 1e-23)
+        count = self.particle_count(mass)
 
-        new_particles = self.create_particles(count=count, near_valve=True, pressure_ratio=pressure_ratio)
-        self.particles.extend(new_particles)
+        self.particles.add(**self.create_particles(count=count, near_valve=True, pressure_ratio=pressure_ratio))
 
         self.gas_sim.add_gas(mass)
         self.valve_open = False
@@ -175,121 +107,108 @@ class UIDiagnostics:
     def release_gas_via_valve(self, mass):
         self.valve_right_open = True
 
-        moles = mass / 0.032
-        avogadro_number = 6.022e23
-        num_particles_to_remove = int(moles * avogadro_number * 1e-23)
-
-        particles_with_distance = []
-        for particle in self.particles:
-            distance = math.sqrt((particle.x - self.valve_right_rect.left) ** 2 + (particle.y - self.valve_right_rect.centery) ** 2)
-            particles_with_distance.append((particle, distance))
+        num_particles_to_remove = self.particle_count(mass)
 
-        particles_with_distance.sort(key=lambda p: p[1])
+        # Partial selection of the nearest particles: O(N) rather than a full sort
+        distance = np.hypot(self.particles.x - self.valve_right_rect.left, self.particles.y - self.valve_right_rect.centery)
+        if num_particles_to_remove >= len(distance):
+            to_release = np.arange(len(distance))
+        else:
+            to_release = np.argpartition(distance, num_particles_to_remove)[:num_particles_to_remove]
 
-        particles_to_release = [p[0] for p in particles_with_distance[:num_particles_to_remove]]
+        released = self.particles.take(to_release)
+        self.particles.swap_remove(to_release)
 
-        for particle in particles_to_release:
-            self.particles.remove(particle)
-            particle.exiting = True
-            direction = math.atan2(self.valve_right_rect.centery - particle.y, self.valve_right_rect.left - particle.x)
-            particle.vx = 2.0 * math.cos(direction)
-            particle.vy = 2.0 * math.sin(direction)
-            self.particles_moving_outward.append(particle)
+        positions = released['positions']
+        direction = np.arctan2(self.valve_right_rect.centery - positions[:, 1], self.valve_right_rect.left - positions[:, 0])
+        released['velocities'][:, 0] = 2.0 * np.cos(direction)
+        released['velocities'][:, 1] = 2.0 * np.sin(direction)
+        released['exiting'] = True
+        self.particles_moving_outward.add(**released)
 
         self.gas_sim.release_gas(mass)
         self.valve_right_open = False
 
-    def update(self):
+    def resize_container(self):
         scale = self.gas_sim.volume / 10.0
         self.inner_rect.width = int(200 * scale)
         self.inner_rect.height = int(200 * scale)
         self.container_rect.width = self.inner_rect.width + 10
         self.container_rect.height = self.inner_rect.height + 10
 
-        # Create a dictionary to hold particles in each grid cell
-        grid = defaultdict(list)
-
-        # Calculate the grid coordinates for each particle and assign them to the grid
-        for particle in self.particles:
-            grid_x = int((particle.x - self.container_rect.left) / self.grid_size)
-            grid_y = int((particle.y - self.container_rect.top) / self.grid_size)
-            grid[(grid_x, grid_y)].append(particle)
-
-        # Function to update and check collisions within a grid cell and its neighbors
-        def update_grid_cell(cell_key):
-            particles_in_cell = grid[cell_key]
-            
-            # Check collisions within the same cell
-            for i, particle in enumerate(particles_in_cell):
-                for j in range(i + 1, len(particles_in_cell)):
-                    particle.collide_with(particles_in_cell[j])
-                particle.move()
-            
-            # Check collisions with particles in neighboring cells
-            neighbors = [
-                (cell_key[0] - 1, cell_key[1] - 1), (cell_key[0], cell_key[1] - 1), (cell_key[0] + 1, cell_key[1] - 1),
-                (cell_key[0] - 1, cell_key[1]),                                   (cell_key[0] + 1, cell_key[1]),
-                (cell_key[0] - 1, cell_key[1] + 1), (cell_key[0], cell_key[1] + 1), (cell_key[0] + 1, cell_key[1] + 1)
-            ]
-
-            # Ensure particles are only checked once per neighboring pair
-            for neighbor_key in neighbors:
-                if neighbor_key in grid:
-                    neighbor_particles = grid[neighbor_key]
-                    for particle in particles_in_cell:
-                        for neighbor_particle in neighbor_particles:
-                            if particle.x < neighbor_particle.x:  # To avoid double-checking
-                                particle.collide_with(neighbor_particle)
-
-            # Move particles after collision checks
-            for particle in particles_in_cell:
-                particle.move()
-
-
-        # Use the persistent ThreadPoolExecutor to parallelize the updates
-        self.executor.map(update_grid_cell, grid.keys())
-
-        # Update particles moving outward
-        for particle in self.particles_moving_outward:
-            particle.move_outward()
-
-        # Remove particles that are fully faded out
-        self.particles_moving_outward = [p for p in self.particles_moving_outward if p.alpha > 0]
-
-    def draw(self, screen):
-        temperature_text = self.font.render(f"Temperature: {self.gas_sim.temperature} K", True, (255, 255, 255))
-        pressure_text = self.font.render(f"Pressure: {self.gas_sim.pressure:.2f} Pa", True, (255, 255, 255))
-        volume_text = self.font.render(f"Volume: {self.gas_sim.volume} m^3", True, (255, 255, 255))
-        mass_text = self.font.render(f"Mass: {self.gas_sim.mass} kg", True, (255, 255, 255))
-        fps_text = self.fps_font.render(f"FPS: {int(self.clock.get_fps())}", True, (255, 255, 255))
-
-        screen.blit(temperature_text, (20, 20))
-        screen.blit(pressure_text, (20, 60))
-        screen.blit(volume_text, (20, 100))
-        screen.blit(mass_text, (20, 140))
-        screen.blit(fps_text, (20, 180))
-
-        pygame.draw.rect(screen, (255, 255, 255), self.container_rect, 2)
-
-        for particle in self.particles:
-            particle.draw(screen)
-
-        for particle in self.particles_moving_outward:
-            particle.draw(screen)
-
-        valve_color = (0, 255, 0) if self.valve_open else (255, 0, 0)
+    def update(self):
+        self.resize_container()
+        self.thermostat.update(self.particles, self.gas_sim.temperature, self.rng, dynamics=self.event_driven)
+
+        start = time.perf_counter()
+        if self.event_driven is not None:
+            with self.step_profiler.scope('event_queue'):
+                self.event_driven.advance(self.particles)
+        else:
+            self.step_particles()
+        self.gauge.sample(self.particles, self.gas_sim)
+        if self.budget is not None:
+            self.budget.update(self.particles, time.perf_counter() - start, self.rng)
+
+        # Update particles moving outward and drop the ones that have fully faded out
+        outward = self.particles_moving_outward
+        outward.move_outward()
+        faded = np.flatnonzero(outward.alpha == 0)
+        if len(faded):
+            outward.swap_remove(faded)
+
+    def step_particles(self):
+        # Resolve collisions for every candidate pair, then integrate every particle once
+        profiler = self.step_profiler
+        with profiler.scope('grid'):
+            first, second, grid_x, grid_y = self.broad_phase.update(self.particles, self.inner_rect)
+        with profiler.scope('collisions'):
+            self.collisions.resolve(self.particles, first, second, grid_x, grid_y)
+        with profiler.scope('move'):
+            self.particles.move()
+
+    def draw(self, screen, snapshot=None):
+        # With a GasSnapshot the frame shows that copy instead of the live simulation (threaded mode)
+        state = self if snapshot is None else snapshot
+        with self.profiler.scope('text'):
+            temperature_text = text_cache.render(self.font, f"Temperature: {state.gas_sim.temperature} K", True, (255, 255, 255))
+            pressure_text = text_cache.render(self.font, f"Pressure: {state.gas_sim.pressure:.2f} Pa", True, (255, 255, 255))
+            volume_text = text_cache.render(self.font, f"Volume: {state.gas_sim.volume} m^3", True, (255, 255, 255))
+            mass_text = text_cache.render(self.font, f"Mass: {state.gas_sim.mass} kg", True, (255, 255, 255))
+            fps_text = text_cache.render(self.fps_font, f"FPS: {int(self.clock.get_fps())}", True, (255, 255, 255))
+            measured_temperature_text = text_cache.render(self.fps_font, f"measured {state.gauge.measured_temperature:.1f} K", True, (180, 180, 180))
+            measured_pressure_text = text_cache.render(self.fps_font, f"measured {state.gauge.measured_pressure:.0f} Pa", True, (180, 180, 180))
+
+            screen.blit(temperature_text, (20, 20))
+            screen.blit(pressure_text, (20, 60))
+            screen.blit(volume_text, (20, 100))
+            screen.blit(mass_text, (20, 140))
+            screen.blit(fps_text, (20, 180))
+            if state.particles.weight != 1.0:
+                weight_text = text_cache.render(self.fps_font, f"1 particle = {state.particles.weight:.1f} units", True, (180, 180, 180))
+                screen.blit(weight_text, (20, 205))
+            screen.blit(measured_temperature_text, (temperature_text.get_width() + 40, 28))
+            screen.blit(measured_pressure_text, (pressure_text.get_width() + 40, 68))
+
+        pygame.draw.rect(screen, (255, 255, 255), state.container_rect, 2)
+
+        with self.profiler.scope('particles'):
+            self.particle_renderer.draw(screen, state.particles)
+            self.particle_renderer.draw(screen, state.particles_moving_outward)
+
+        valve_color = (0, 255, 0) if state.valve_open else (255, 0, 0)
         pygame.draw.rect(screen, valve_color, self.valve_left_rect)
 
-        valve_right_color = (0, 255, 0) if self.valve_right_open else (255, 0, 0)
+        valve_right_color = (0, 255, 0) if state.valve_right_open else (255, 0, 0)
         pygame.draw.rect(screen, valve_right_color, self.valve_right_rect)
 
         for key, rect in self.buttons.items():
-            pygame.draw.rect(screen, (0, 255, 0), rect)
+            active = key == 'event_driven' and state.event_driven is not None
+            pygame.draw.rect(screen, (255, 255, 0) if active else (0, 255, 0), rect)
             button_text = key.replace('_', ' ').title()
-            screen.blit(self.font.render(button_text, True, (0, 0, 0)), (rect.x + 10, rect.y + 5))
+            screen.blit(text_cache.render(self.font, button_text, True, (0, 0, 0)), (rect.x + 10, rect.y + 5))
 
-    def update_particles(self):
-        self.particles = self.create_particles()
+        self.profiler.draw_overlay(screen, self.fps_font, (screen.get_width() - 330, 10))
 
     def handle_event(self, event):
         if event.type == pygame.MOUSEBUTTONDOWN:
@@ -301,11 +220,53 @@ class UIDiagnostics:
                         self.gas_sim.change_volume(-1.0)
                     elif key == 'increase_temp':
                         self.gas_sim.change_temperature(10)
-                        self.update_particles()
                     elif key == 'decrease_temp':
                         self.gas_sim.change_temperature(-10)
-                        self.update_particles()
                     elif key == 'add_gas':
                         self.add_gas_via_valve(0.1)
                     elif key == 'release_gas':
                         self.release_gas_via_valve(0.1)
+                    elif key == 'event_driven':
+                        self.event_driven = None if self.event_driven is not None else EventDrivenGas()
+        elif event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+            # Show or hide the phase timing overlay
+            self.profiler.show_overlay = not self.profiler.show_overlay
+
+
+class GasSnapshot:
+    # Copy of everything UIDiagnostics.draw() reads, filled on the simulation thread so the
+    # render thread can draw it while the next step runs
+    def __init__(self, ui):
+        self.inner_rect = ui.inner_rect.copy()
+        self.container_rect = ui.container_rect.copy()
+        self.particles = ParticleStore(self.inner_rect)
+        self.particles_moving_outward = ParticleStore(self.inner_rect)
+        self.gas_sim = GasSimulation(ui.gas_sim.volume, ui.gas_sim.temperature, ui.gas_sim.mass, ui.gas_sim.R, ui.gas_sim.eos)
+        self.gauge = PressureGauge(window=1)
+        self.valve_open = False
+        self.valve_right_open = False
+        self.event_driven = None
+        self.step = 0
+
+    @staticmethod
+    def _copy_store(source, target):
+        target.clear()
+        target.add(source.positions, source.velocities, source.pressure_ratio, source.exiting, source.alpha)
+        target.weight = source.weight
+
+    def capture(self, ui, step=0):
+        self.inner_rect.update(ui.inner_rect)
+        self.container_rect.update(ui.container_rect)
+        self._copy_store(ui.particles, self.particles)
+        self._copy_store(ui.particles_moving_outward, self.particles_moving_outward)
+        gas_sim = ui.gas_sim
+        self.gas_sim.volume = gas_sim.volume
+        self.gas_sim.temperature = gas_sim.temperature
+        self.gas_sim.mass = gas_sim.mass
+        self.gas_sim.pressure = gas_sim.pressure
+        self.gauge.measured_temperature = ui.gauge.measured_temperature
+        self.gauge.measured_pressure = ui.gauge.measured_pressure
+        self.valve_open = ui.valve_open
+        self.valve_right_open = ui.valve_right_open
+        self.event_driven = ui.event_driven
+        self.step = step
@@ -0,0 +1,161 @@
+import math
+import threading
+import numpy as np
+import pygame
+from otto_solver import FOUR_STROKE_CYCLE
+from pressure_sim.text_cache import text_cache
+
+
+class IndicatedWork:
+    # Loop integral of p dV, accumulated one physics step at a time with the trapezoid rule, so a
+    # step costs the same however long the engine has run. A cycle closes when cylinder 1's cycle
+    # angle wraps; over any 720 degrees every cylinder completes its own cycle, so the work summed
+    # over the cylinders in that span is the engine's indicated work per cycle.
+    def __init__(self, displacement):
+        self.displacement = displacement  # Swept volume of all cylinders, m^3
+        self.reset()
+
+    def reset(self):
+        self._volume = None
+        self._pressure = None
+        self._cycle_angle = None
+        self._started = False  # The cycle in progress at a reset is partial and not reported
+        self.current = 0.0
+        self.cycle_work = None  # J over the last complete cycle
+        self.cycles = 0
+
+    def add(self, volume, pressure, cycle_angle):
+        # Scalars for one cylinder or arrays with one entry per cylinder
+        if self._volume is not None:
+            if isinstance(volume, np.ndarray):
+                self.current += float(np.dot(pressure + self._pressure, volume - self._volume)) / 2
+            else:
+                self.current += (pressure + self._pressure) * (volume - self._volume) / 2
+            if cycle_angle < self._cycle_angle:
+                if self._started:
+                    self.cycle_work = self.current
+                    self.cycles += 1
+                self._started = True
+                self.current = 0.0
+        self._volume = volume
+        self._pressure = pressure
+        self._cycle_angle = cycle_angle
+
+    @property
+    def imep(self):
+        # Indicated mean effective pressure, Pa
+        return None if self.cycle_work is None else self.cycle_work / self.displacement
+
+    def power(self, rpm):
+        # W; a four-stroke cylinder completes one cycle every two revolutions
+        return None if self.cycle_work is None else self.cycle_work * rpm / 120
+
+
+class PVRing:
+    # The last `capacity` (volume, pressure) points, kept at least `spacing` radians of cycle angle
+    # apart so slow motion does not crowd the buffer with near-identical points
+    def __init__(self, capacity=1024, spacing=FOUR_STROKE_CYCLE / 360):
+        self.capacity = capacity
+        self.spacing = spacing
+        self.volume = np.zeros(capacity)
+        self.pressure = np.zeros(capacity)
+        self.clear()
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        self.head = 0
+        self.count = 0
+        self._last_angle = None
+
+    def add(self, volume, pressure, cycle_angle):
+        if self._last_angle is not None and (cycle_angle - self._last_angle) % FOUR_STROKE_CYCLE < self.spacing:
+            return
+        self._last_angle = cycle_angle
+        self.volume[self.head] = volume
+        self.pressure[self.head] = pressure
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def points(self):
+        # Copies, oldest first
+        if self.count < self.capacity:
+            return self.volume[:self.count].copy(), self.pressure[:self.count].copy()
+        return np.roll(self.volume, -self.head), np.roll(self.pressure, -self.head)
+
+
+class PVDiagram:
+    # Live pressure-volume loop of cylinder 1 with the engine's indicated work, IMEP and power.
+    # record() runs after every physics step, on whichever thread steps the engine; draw() runs
+    # on the render thread and only reads copies taken under the lock.
+    def __init__(self, engine, rect, font, capacity=1024):
+        self.engine = engine
+        self.rect = pygame.Rect(rect)
+        self.font = font
+        self.visible = True
+        self.ring = PVRing(capacity)
+        self.work = IndicatedWork(engine.swept_volume * getattr(engine, 'cylinders', 1))
+        self.plot = pygame.Rect(self.rect.x + 10, self.rect.y + 30, self.rect.width - 20, self.rect.height - 85)
+        self.black = (0, 0, 0)
+        self.line = (200, 0, 0)
+        self._lock = threading.Lock()
+        self._rpm = 0.0
+
+    def record(self):
+        engine = self.engine
+        volumes = getattr(engine, 'volumes', None)
+        volume = engine.cylinder_volume() if volumes is None else volumes
+        pressure = engine.pressure
+        with self._lock:
+            self.work.add(volume, pressure, engine.cycle_angle)
+            if volumes is None:
+                self.ring.add(volume, pressure, engine.cycle_angle)
+            else:
+                self.ring.add(volume[0], pressure[0], engine.cycle_angle)
+            self._rpm = engine.rpm
+
+    def reset(self):
+        # After a jump in the engine state, e.g. seeking in a replay
+        with self._lock:
+            self.ring.clear()
+            self.work.reset()
+
+    def static_key(self):
+        return (tuple(self.rect), self.visible)
+
+    def draw_static(self, surface):
+        # Frame, axes and title; EngineView keeps them in its cached background
+        if not self.visible:
+            return
+        pygame.draw.rect(surface, (245, 245, 245), self.rect)
+        pygame.draw.rect(surface, self.black, self.rect, 1)
+        pygame.draw.lines(surface, self.black, False, [self.plot.topleft, self.plot.bottomleft, self.plot.bottomright])
+        surface.blit(text_cache.render(self.font, "p-V, cylinder 1", True, self.black), (self.rect.x + 10, self.rect.y + 6))
+
+    def draw(self, screen):
+        # Returns the rects drawn, for EngineView
+        if not self.visible:
+            return []
+        with self._lock:
+            volume, pressure = self.ring.points()
+            work, imep, power = self.work.cycle_work, self.work.imep, self.work.power(self._rpm)
+
+        engine = self.engine
+        low = engine.clearance_volume
+        high = low + engine.swept_volume
+        top = max(1.0, math.ceil(pressure.max() / 1e6)) * 1e6 if len(pressure) else 1e6  # Whole MPa, so the scale rarely moves
+        if len(volume) > 1:
+            x = self.plot.left + (volume - low) / (high - low) * self.plot.width
+            y = self.plot.bottom - np.clip(pressure / top, 0.0, 1.0) * self.plot.height
+            pygame.draw.lines(screen, self.line, False, np.column_stack((x, y)).tolist(), 2)
+
+        screen.blit(text_cache.render(self.font, f"{top / 1e5:.0f} bar", True, self.black), (self.plot.right - 60, self.rect.y + 6))
+        if work is None:
+            lines = ("Indicated work: waiting for a full cycle", "")
+        else:
+            lines = (f"Work {work:.1f} J/cycle   IMEP {imep / 1e5:.2f} bar", f"Indicated power {power / 1000:.2f} kW")
+        for row, text in enumerate(lines):
+            if text:
+                screen.blit(text_cache.render(self.font, text, True, self.black), (self.rect.x + 10, self.plot.bottom + 8 + row * 22))
+        return [self.rect]
@@ -0,0 +1,39 @@
+import math
+
+
+class SimulationClock:
+    # Fixed-timestep accumulator. Real frame time (scaled by speed_factor) is banked and
+    # spent in equal physics steps; the step shrinks with crank speed so that no step turns
+    # the crank more than max_step_degrees. The leftover fraction is returned as the
+    # interpolation alpha for rendering.
+    def __init__(self, max_timestep=1 / 240, max_step_degrees=5.0, max_frame_time=0.25, max_steps_per_frame=20000):
+        self.max_timestep = max_timestep
+        self.max_step_angle = math.radians(max_step_degrees)
+        self.max_frame_time = max_frame_time  # Clamp after stalls so we never try to catch up forever
+        self.max_steps_per_frame = max_steps_per_frame
+        self.accumulator = 0.0
+        self.alpha = 0.0
+        self.steps_last_frame = 0
+        self.simulated_time = 0.0
+
+    def step_size(self, angular_velocity):
+        if angular_velocity == 0:
+            return self.max_timestep
+        return min(self.max_timestep, self.max_step_angle / abs(angular_velocity))
+
+    def advance(self, frame_seconds, angular_velocity, speed_factor, step):
+        # Calls step(dt) as many times as the banked time allows and returns the render alpha
+        self.accumulator += min(frame_seconds, self.max_frame_time) * speed_factor
+        dt = self.step_size(angular_velocity)
+        steps = 0
+        while self.accumulator >= dt and steps < self.max_steps_per_frame:
+            step(dt)
+            self.accumulator -= dt
+            steps += 1
+        if steps == self.max_steps_per_frame:
+            # Too far behind to ever catch up: drop the backlog rather than spiral
+            self.accumulator = 0.0
+        self.simulated_time += steps * dt
+        self.steps_last_frame = steps
+        self.alpha = self.accumulator / dt
+        return self.alpha
@@ -1,25 +1,180 @@
+import math
+import threading
+import numpy as np
 import pygame
 
 class EngineSound:
-    def __init__(self, sample_rate=44100):
+    # One-shot samples per stroke. Sounds come from load_sound(name), which returns a
+    # pygame Sound or None; they are fetched on first play, and missing ones stay silent.
+    PHASES = ('intake', 'compression', 'ignition', 'exhaust')
+
+    def __init__(self, load_sound):
+        self.load_sound = load_sound
+        self.channels = {}
+        self.sounds = {}
+        self.volume = None
+
+    def _sound(self, phase):
+        if phase not in self.sounds:
+            self.sounds[phase] = self.load_sound(phase)
+            if self.sounds[phase] is not None and self.volume is not None:
+                self.sounds[phase].set_volume(self.volume)
+        return self.sounds[phase]
+
+    def play_cycle(self, phase):
+        sound = self._sound(phase)
+        if sound is None:
+            return
+        channel = self.channels.get(phase)
+        if channel is None:
+            channel = self.channels[phase] = pygame.mixer.Channel(self.PHASES.index(phase))
+        channel.play(sound)
+
+    def adjust_volume(self, volume):
+        self.volume = volume
+        for sound in self.sounds.values():
+            if sound is not None:
+                sound.set_volume(volume)
+
+
+class RingBuffer:
+    # Fixed-size single-producer/single-consumer sample ring
+    def __init__(self, capacity):
+        self.samples = np.zeros(capacity, dtype=np.int16)
+        self.capacity = capacity
+        self.read_index = 0
+        self.size = 0
+        self.lock = threading.Lock()
+        self.space_available = threading.Condition(self.lock)
+
+    def free(self):
+        return self.capacity - self.size
+
+    def write(self, block, timeout=None):
+        # Blocks the producer until there is room for the whole block
+        with self.space_available:
+            if not self.space_available.wait_for(lambda: self.free() >= len(block), timeout):
+                return False
+            start = (self.read_index + self.size) % self.capacity
+            first = min(len(block), self.capacity - start)
+            self.samples[start:start + first] = block[:first]
+            self.samples[:len(block) - first] = block[first:]
+            self.size += len(block)
+            return True
+
+    def read(self, count):
+        # Never blocks: returns whatever is available up to count samples
+        with self.lock:
+            count = min(count, self.size)
+            indices = (self.read_index + np.arange(count)) % self.capacity
+            block = self.samples[indices]
+            self.read_index = (self.read_index + count) % self.capacity
+            self.size -= count
+            self.space_available.notify()
+        return block
+
+
+class EngineAudio:
+    # Engine sound synthesized from the cylinder pressure trace. A producer thread renders
+    # blocks ahead of playback into a ring buffer; pump() hands finished blocks to a mixer
+    # channel as queued Sounds and never waits on the producer.
+    def __init__(self, sample_rate=44100, block_size=1024, buffer_blocks=4, channel=0, volume=0.6):
         self.sample_rate = sample_rate
+        self.block_size = block_size
+        self.volume = volume
         pygame.mixer.init(frequency=self.sample_rate)
-        self.channels = {
-            'intake': pygame.mixer.Channel(0),
-            'compression': pygame.mixer.Channel(1),
-            'ignition': pygame.mixer.Channel(2),
-            'exhaust': pygame.mixer.Channel(3)
-        }
-        self.sounds = {
-            'intake': pygame.mixer.Sound('sounds/intake.wav'),
-            'compression': pygame.mixer.Sound('sounds/compression.wav'),
-            'ignition': pygame.mixer.Sound('sounds/ignition.wav'),
-            'exhaust': pygame.mixer.Sound('sounds/exhaust.wav')
-        }
+        self.mixer_channels = pygame.mixer.get_init()[2]
+        self.channel = pygame.mixer.Channel(channel)
+        self.ring = RingBuffer(block_size * buffer_blocks)
 
-    def play_cycle(self, phase):
-        self.channels[phase].play(self.sounds[phase])
+        self.target_rpm = 0.0
+        self.rpm = 0.0
+        self.trace = None
+        self.phase_offsets = np.zeros(1)
+        self.phase = 0.0
+        self._previous = 0.0
+        self._smoothing = 1.0 - math.exp(-1.0 / (0.05 * sample_rate))  # ~50 ms RPM glide
+        self._noise = np.random.default_rng()
+
+        self.running = True
+        self.producer = threading.Thread(target=self._produce, name='engine-audio', daemon=True)
+        self.producer.start()
+
+    def set_state(self, rpm, trace, phase_offsets=None):
+        # Called from the render loop; plain attribute swaps are safe for the producer to read
+        self.target_rpm = max(0.0, float(rpm))
+        self.trace = trace
+        if phase_offsets is not None:
+            self.phase_offsets = np.asarray(phase_offsets, dtype=float)
+
+    def synthesize(self, count):
+        trace = self.trace
+        if trace is None:
+            return np.zeros(count, dtype=np.int16)
+
+        # Glide the RPM towards its target sample by sample, then integrate the cycle angle
+        decay = (1.0 - self._smoothing) ** np.arange(1, count + 1)
+        rpm = self.target_rpm + (self.rpm - self.target_rpm) * decay
+        self.rpm = float(rpm[-1])
+        step = rpm / 60.0 * 2 * math.pi / self.sample_rate
+        angle = self.phase + np.cumsum(step)
+        self.phase = float(angle[-1] % (4 * math.pi))
+
+        # The rate of change of the summed cylinder pressure gives the combustion pulses
+        pressure = trace.pressure_at(angle[:, None] - self.phase_offsets[None, :]).sum(axis=1)
+        pulses = np.diff(pressure, prepend=self._previous)
+        self._previous = float(pressure[-1])
+        scale = trace.peak_pressure * 2 * math.pi * 5000 / 60.0 / self.sample_rate
+        signal = pulses / scale + 0.02 * (pressure / trace.peak_pressure) * self._noise.standard_normal(count)
+        signal = np.tanh(4.0 * signal) * self.volume
+        return (signal * 32767).astype(np.int16)
+
+    def _produce(self):
+        while self.running:
+            block = self.synthesize(self.block_size)
+            while self.running and not self.ring.write(block, timeout=0.1):
+                pass
+
+    def _sound(self, samples):
+        if self.mixer_channels > 1:
+            samples = np.repeat(samples[:, None], self.mixer_channels, axis=1)
+        return pygame.sndarray.make_sound(np.ascontiguousarray(samples))
+
+    def pump(self):
+        # Keep the channel playing with one block and one more queued behind it
+        if not self.channel.get_busy():
+            samples = self.ring.read(2 * self.block_size)
+            if len(samples):
+                self.channel.play(self._sound(samples))
+        elif self.channel.get_queue() is None:
+            samples = self.ring.read(self.block_size)
+            if len(samples):
+                self.channel.queue(self._sound(samples))
 
     def adjust_volume(self, volume):
-        for phase in self.sounds:
-            self.sounds[phase].set_volume(volume)
\ No newline at end of file
+        self.volume = volume
+
+    def close(self):
+        self.running = False
+        self.producer.join(timeout=1.0)
+        self.channel.stop()
+
+
+class NullAudio:
+    # Stand-in for EngineAudio without an audio device: same interface, no thread, no output
+    def __init__(self):
+        self.rpm = 0.0
+        self.phase = 0.0
+        self.volume = 0.0
+
+    def set_state(self, rpm, trace, phase_offsets=None):
+        self.rpm = max(0.0, float(rpm))
+
+    def pump(self):
+        pass
+
+    def adjust_volume(self, volume):
+        self.volume = volume
+
+    def close(self):
+        pass
@@ -0,0 +1,198 @@
+import argparse
+import json
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from kinematics import METRES_PER_PIXEL, crank_kinematics
+from otto_solver import CycleParameters, cycle_trace
+
+# Geometry in pixels (1 px = 1 mm) like the engine on screen; bore is the piston width.
+# Any other CycleParameters field can be swept too.
+DEFAULTS = {'crank_radius': 100.0, 'rod_length': 200.0, 'bore': 60.0, 'compression_ratio': 10.0, 'rpm': 1000.0}
+AXES = CycleParameters._fields + ('rpm',)
+METRICS = ('valid', 'peak_pressure', 'peak_pressure_angle', 'peak_temperature', 'indicated_work', 'imep',
+           'indicated_power', 'mean_piston_speed', 'max_piston_speed', 'max_piston_acceleration', 'min_piston_acceleration')
+INTEGER_FIELDS = {name: int for name, value in CycleParameters._field_defaults.items() if isinstance(value, int)}
+MANIFEST = 'manifest.json'
+RESULTS = 'results.npz'
+
+
+def parse_axis(text):
+    # "a,b,c" for a list of values, "start:stop:count" for evenly spaced values (both ends included)
+    if ':' in text:
+        start, stop, count = text.split(':')
+        return np.linspace(float(start), float(stop), int(count)).tolist()
+    return [float(value) for value in text.split(',')]
+
+
+def grid_size(axes):
+    return math.prod(len(values) for values in axes.values())
+
+
+def grid_points(axes, start, stop):
+    # Columns for points [start, stop) of the cartesian product, the last axis varying fastest.
+    # Points are addressed by index, so no chunk needs the whole grid in memory.
+    names = list(axes)
+    shape = [len(axes[name]) for name in names]
+    indices = np.unravel_index(np.arange(start, stop), shape)
+    return {name: np.asarray(axes[name], dtype=float)[index] for name, index in zip(names, indices)}
+
+
+def evaluate(crank_radius, rod_length, bore, compression_ratio, rpm, **cycle_options):
+    # Metrics of one configuration in SI units, from the same solver and kinematics tables the engine draws with
+    if rod_length <= crank_radius or compression_ratio <= 1:
+        return None
+    trace = cycle_trace(CycleParameters(crank_radius, rod_length, bore, compression_ratio, **cycle_options))
+    kinematics = crank_kinematics(crank_radius, rod_length)
+    omega = rpm / 60 * 2 * math.pi
+
+    # Net work of the loop, the closed integral of p dV
+    work = float(np.sum((trace.pressure[1:] + trace.pressure[:-1]) / 2 * np.diff(trace.volume)))
+    swept = trace.volume.max() - trace.volume.min()
+    peak = int(np.argmax(trace.pressure))
+    return {
+        'valid': True,
+        'peak_pressure': trace.peak_pressure,
+        'peak_pressure_angle': float(trace.angle[peak]),
+        'peak_temperature': float(trace.temperature.max()),
+        'indicated_work': work,
+        'imep': work / swept,
+        'indicated_power': work * rpm / 120,  # One cycle every two revolutions
+        'mean_piston_speed': 4 * crank_radius * METRES_PER_PIXEL * rpm / 60,
+        'max_piston_speed': float(np.abs(kinematics.velocity).max()) * omega * METRES_PER_PIXEL,
+        'max_piston_acceleration': float(kinematics.acceleration.max()) * omega ** 2 * METRES_PER_PIXEL,
+        'min_piston_acceleration': float(kinematics.acceleration.min()) * omega ** 2 * METRES_PER_PIXEL,
+    }
+
+
+def evaluate_chunk(axes, fixed, start, stop):
+    # Runs in a worker process; returns columns for points [start, stop).
+    # Neighbouring points usually share geometry, so the solver and kinematics caches do most of the work.
+    columns = grid_points(axes, start, stop)
+    count = stop - start
+    results = {name: np.full(count, np.nan) for name in METRICS}
+    results['valid'] = np.zeros(count, dtype=bool)
+    for k in range(count):
+        point = dict(fixed)
+        point.update((name, INTEGER_FIELDS.get(name, float)(values[k])) for name, values in columns.items())
+        metrics = evaluate(**point)
+        if metrics is not None:
+            for name, value in metrics.items():
+                results[name][k] = value
+    return results
+
+
+def chunk_path(directory, chunk):
+    return os.path.join(directory, f'chunk_{chunk:06d}.npz')
+
+
+def write_chunk(path, columns):
+    # Written under a temporary name and renamed, so an interrupted run never leaves half a chunk
+    partial = path + '.partial.npz'
+    np.savez(partial, **columns)
+    os.replace(partial, path)
+
+
+def prepare(directory, axes, fixed, chunk_size):
+    # A sweep directory belongs to one grid; resuming with a different grid would mix results
+    manifest = {'axes': axes, 'fixed': fixed, 'chunk_size': chunk_size, 'points': grid_size(axes)}
+    path = os.path.join(directory, MANIFEST)
+    os.makedirs(directory, exist_ok=True)
+    if os.path.exists(path):
+        with open(path) as f:
+            existing = json.load(f)
+        if existing != json.loads(json.dumps(manifest)):
+            raise ValueError(f"{directory} holds a different sweep; use another directory")
+    else:
+        with open(path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def run_sweep(axes, directory, fixed=None, chunk_size=256, workers=None, progress=None):
+    # Evaluates every point of the grid, skipping chunks already on disk, then merges them into
+    # one columnar results file. Returns the path of that file.
+    fixed = {name: value for name, value in DEFAULTS.items() if name not in axes} | (fixed or {})
+    unknown = set(axes) - set(AXES)
+    if unknown:
+        raise ValueError(f"unknown sweep parameters: {', '.join(sorted(unknown))}")
+    manifest = prepare(directory, axes, fixed, chunk_size)
+    points = manifest['points']
+    chunks = -(-points // chunk_size)
+    pending = [chunk for chunk in range(chunks) if not os.path.exists(chunk_path(directory, chunk))]
+
+    done = chunks - len(pending)
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(evaluate_chunk, axes, fixed, chunk * chunk_size, min((chunk + 1) * chunk_size, points)): chunk
+                       for chunk in pending}
+            for future in as_completed(futures):
+                write_chunk(chunk_path(directory, futures[future]), future.result())
+                done += 1
+                if progress is not None:
+                    progress(done, chunks)
+    return merge(directory, axes, chunks)
+
+
+def merge(directory, axes, chunks):
+    parts = [np.load(chunk_path(directory, chunk)) for chunk in range(chunks)]
+    columns = grid_points(axes, 0, grid_size(axes))
+    for name in METRICS:
+        columns[name] = np.concatenate([part[name] for part in parts])
+    for part in parts:
+        part.close()
+    path = os.path.join(directory, RESULTS)
+    write_chunk(path, columns)
+    return path
+
+
+def load_results(directory):
+    # {column: array}, parameters and metrics side by side, one entry per grid point
+    with np.load(os.path.join(directory, RESULTS)) as data:
+        return {name: data[name] for name in data.files}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate a grid of Otto cycle engine configurations in parallel.")
+    parser.add_argument('directory', help="where chunks and results are written; rerun to resume")
+    parser.add_argument('--crank-radius', help="values in px (mm): a,b,c or start:stop:count")
+    parser.add_argument('--rod-length', help="values in px (mm)")
+    parser.add_argument('--bore', help="values in px (mm)")
+    parser.add_argument('--compression-ratio')
+    parser.add_argument('--rpm')
+    parser.add_argument('--param', action='append', default=[], metavar='NAME=VALUES',
+                        help="sweep any other CycleParameters field, e.g. ignition_angle=340:360:5")
+    parser.add_argument('--chunk-size', type=int, default=256, help="points per task and per file on disk")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: one per CPU)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    axes = {}
+    for name in ('crank_radius', 'rod_length', 'bore', 'compression_ratio'):
+        if getattr(args, name) is not None:
+            axes[name] = parse_axis(getattr(args, name))
+    for entry in args.param:
+        name, _, values = entry.partition('=')
+        axes[name] = parse_axis(values)
+    # rpm last: it does not change the cycle solution, so consecutive points reuse the cached trace
+    if args.rpm is not None:
+        axes['rpm'] = parse_axis(args.rpm)
+
+    start = time.perf_counter()
+
+    def progress(done, chunks):
+        print(f"\r{done}/{chunks} chunks", end='', file=sys.stderr)
+
+    path = run_sweep(axes, args.directory, chunk_size=args.chunk_size, workers=args.workers, progress=progress)
+    results = load_results(args.directory)
+    print(f"\n{len(results['valid'])} points ({int(results['valid'].sum())} valid) in {time.perf_counter() - start:.1f} s -> {path}",
+          file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
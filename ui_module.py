@@ -1,8 +1,9 @@
 import pygame
+from pressure_sim.text_cache import font, text_cache
 
 class UI:
     def __init__(self):
-        self.font = pygame.font.SysFont(None, 24)
+        self.font = font(24)
         self.red = (255, 0, 0)
         self.black = (0, 0, 0)
         self.gray = (200, 200, 200)
@@ -10,32 +11,39 @@ class UI:
         self.active_slider = None  # Track which slider is active
 
     def draw_slider(self, screen, slider_pos, slider_width, slider_height, indicator_radius, value, min_value, max_value, label, input_value, input_active):
-        # Draw slider background
+        self.draw_slider_track(screen, slider_pos, slider_width, slider_height, label)
+        self.draw_slider_value(screen, slider_pos, slider_width, slider_height, indicator_radius, value, min_value, max_value, input_value, input_active)
+        return self.slider_rects(slider_pos, slider_width, slider_height)
+
+    def slider_rects(self, slider_pos, slider_width, slider_height):
+        text_box_rect = pygame.Rect(slider_pos[0] + slider_width + 10, slider_pos[1] - slider_height, 80, 30)
+        # Increase the clickable area by expanding the height of the slider rect
+        clickable_rect = pygame.Rect(slider_pos[0], slider_pos[1] - slider_height // 2 - 10, slider_width, slider_height + 20)
+        return text_box_rect, clickable_rect
+
+    def draw_slider_track(self, screen, slider_pos, slider_width, slider_height, label):
+        # The parts of a slider that never change: background, text box outline and label
         pygame.draw.rect(screen, self.gray, (slider_pos[0], slider_pos[1] - slider_height // 2, slider_width, slider_height))
-        
+
+        text_box_rect = self.slider_rects(slider_pos, slider_width, slider_height)[0]
+        pygame.draw.rect(screen, self.box_color, text_box_rect, 2)
+
+        label_text = text_cache.render(self.font, label, True, self.black)
+        screen.blit(label_text, (slider_pos[0] - 60, slider_pos[1] - slider_height // 2))
+
+    def draw_slider_value(self, screen, slider_pos, slider_width, slider_height, indicator_radius, value, min_value, max_value, input_value, input_active):
+        # Indicator and current value; returns the rects drawn so they can be updated on their own
         # Calculate the position of the indicator based on value
         indicator_pos_x = slider_pos[0] + ((value - min_value) / (max_value - min_value)) * slider_width
         indicator_pos_y = slider_pos[1]
         
         # Draw the indicator
-        pygame.draw.circle(screen, self.red, (int(indicator_pos_x), int(indicator_pos_y)), indicator_radius)
-        
-        # Draw the text entry box
-        text_box_rect = pygame.Rect(slider_pos[0] + slider_width + 10, slider_pos[1] - slider_height, 80, 30)
-        pygame.draw.rect(screen, self.box_color, text_box_rect, 2)
+        indicator_rect = pygame.draw.circle(screen, self.red, (int(indicator_pos_x), int(indicator_pos_y)), indicator_radius)
         
         # Display the current value with manual input
-        value_text = self.font.render(input_value, True, self.red if input_active else self.black)
-        screen.blit(value_text, (slider_pos[0] + slider_width + 20, slider_pos[1] - slider_height // 2))
-
-        # Display the label
-        label_text = self.font.render(label, True, self.black)
-        screen.blit(label_text, (slider_pos[0] - 60, slider_pos[1] - slider_height // 2))
-
-        # Increase the clickable area by expanding the height of the slider rect
-        clickable_rect = pygame.Rect(slider_pos[0], slider_pos[1] - slider_height // 2 - 10, slider_width, slider_height + 20)
-
-        return text_box_rect, clickable_rect
+        value_text = text_cache.render(self.font, input_value, True, self.red if input_active else self.black)
+        value_rect = screen.blit(value_text, (slider_pos[0] + slider_width + 20, slider_pos[1] - slider_height // 2))
+        return [indicator_rect, value_rect]
 
     def adjust_value(self, pos, slider_pos, slider_width, min_value, max_value):
         # Adjust value based on mouse position
@@ -78,7 +86,7 @@ class UI:
             speed_input_value = speed_previous_value  # Revert to previous value if inactive
         return rpm_input_value, speed_input_value
 
-    def handle_slider_movement(self, event, rpm_clickable_rect, speed_clickable_rect, rpm, speed_factor):
+    def handle_slider_movement(self, event, rpm_clickable_rect, speed_clickable_rect, rpm, speed_factor, rpm_range=(0, 5000), speed_range=(0.01, 1.0)):
         mouse_pos = pygame.mouse.get_pos()
         if event.type == pygame.MOUSEBUTTONDOWN:
             if rpm_clickable_rect.collidepoint(mouse_pos):
@@ -88,9 +96,9 @@ class UI:
 
         if event.type == pygame.MOUSEMOTION and pygame.mouse.get_pressed()[0]:  # If dragging
             if self.active_slider == 'rpm':
-                rpm = self.adjust_value(mouse_pos, rpm_clickable_rect.topleft, rpm_clickable_rect.width, 0, 5000)
+                rpm = self.adjust_value(mouse_pos, rpm_clickable_rect.topleft, rpm_clickable_rect.width, *rpm_range)
             elif self.active_slider == 'speed':
-                speed_factor = self.adjust_value(mouse_pos, speed_clickable_rect.topleft, speed_clickable_rect.width, 0.01, 1.0)
+                speed_factor = self.adjust_value(mouse_pos, speed_clickable_rect.topleft, speed_clickable_rect.width, *speed_range)
 
         if event.type == pygame.MOUSEBUTTONUP:
             self.active_slider = None  # Reset active slider when mouse is released
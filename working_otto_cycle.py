@@ -1,5 +1,7 @@
 import pygame
 import math
+from sim_clock import SimulationClock
+from pressure_sim.text_cache import font as load_font, text_cache
 
 # Initialize Pygame
 pygame.init()
@@ -8,6 +10,8 @@ pygame.init()
 width, height = 1400, 800  # Updated window size
 screen = pygame.display.set_mode((width, height))
 clock = pygame.time.Clock()
+sim_clock = SimulationClock()
+font = load_font(24)
 
 # Colors
 BLACK = (0, 0, 0)
@@ -37,7 +41,7 @@ rpm_previous_value = rpm_input_value
 
 # Simulation speed parameters
 speed_factor = 1.0  # Start at real-time
-max_speed_factor = 1.0  # Real-time speed
+max_speed_factor = 10.0  # Up to 10x fast-forward
 min_speed_factor = 0.01  # 1/100th speed
 speed_slider_width = 400
 speed_slider_height = 10
@@ -49,6 +53,7 @@ speed_previous_value = speed_input_value
 
 # Simulation parameters
 theta = 0  # Crankshaft angle
+previous_theta = 0  # Angle before the last physics step, for interpolated drawing
 
 # Combustion parameters
 pressure = 1.0  # Initial pressure (normalized)
@@ -87,15 +92,23 @@ def draw_cylinder_head():
     pygame.draw.circle(screen, BLACK, (head_x + 20, head_y + 10), valve_radius)
     pygame.draw.circle(screen, BLACK, (head_x + 40, head_y + 10), valve_radius)
 
-def update_pressure(theta):
+def update_pressure(theta, dt):
     global pressure
     # Simplified model: Increase pressure on compression and combustion, decrease during exhaust
+    rate = 0.02 * 60  # Per second, so the result no longer depends on the frame rate
     if 0 < theta < math.pi:  # Compression phase
-        pressure += 0.02
+        pressure += rate * dt
     elif math.pi < theta < 2 * math.pi:  # Expansion phase
-        pressure -= 0.02
+        pressure -= rate * dt
     pressure = max(1.0, min(combustion_pressure, pressure))  # Clamp pressure to physical limits
 
+def physics_step(dt):
+    # One fixed step of the crankshaft at the current angular_velocity, set by the main loop
+    global theta, previous_theta
+    previous_theta = theta
+    theta = (theta + angular_velocity * dt) % (2 * math.pi)
+    update_pressure(theta, dt)
+
 def draw_slider(slider_pos, slider_width, slider_height, indicator_radius, value, min_value, max_value, label, input_value, input_active):
     # Draw slider background
     pygame.draw.rect(screen, GRAY, (slider_pos[0], slider_pos[1] - slider_height // 2, slider_width, slider_height))
@@ -108,15 +121,14 @@ def draw_slider(slider_pos, slider_width, slider_height, indicator_radius, value
     pygame.draw.circle(screen, RED, (int(indicator_pos_x), int(indicator_pos_y)), indicator_radius)
     
     # Display the current value with manual input
-    font = pygame.font.SysFont(None, 24)
     if input_active:
-        value_text = font.render(input_value, True, RED)
+        value_text = text_cache.render(font, input_value, True, RED)
     else:
-        value_text = font.render(input_value, True, BLACK)
+        value_text = text_cache.render(font, input_value, True, BLACK)
     screen.blit(value_text, (slider_pos[0] + slider_width + 20, slider_pos[1] - slider_height // 2))
     
     # Display the label
-    label_text = font.render(label, True, BLACK)
+    label_text = text_cache.render(font, label, True, BLACK)
     screen.blit(label_text, (slider_pos[0] - 60, slider_pos[1] - slider_height // 2))
 
     return value_text.get_rect(topleft=(slider_pos[0] + slider_width + 20, slider_pos[1] - slider_height // 2))
@@ -201,16 +213,12 @@ while running:
     # Calculate angular velocity (rad/s)
     angular_velocity = (rpm / 60.0) * 2 * math.pi  # Convert RPM to radians per second
 
-    # Update crankshaft angle
-    theta += angular_velocity * speed_factor / 60  # Apply speed factor and time scaling
-    if theta > 2 * math.pi:
-        theta -= 2 * math.pi
-    
-    # Update pressure (this will be used for sound generation later)
-    update_pressure(theta)
+    # Update crankshaft angle and pressure (this will be used for sound generation later) in fixed steps
+    alpha = sim_clock.advance(clock.get_time() / 1000.0, angular_velocity, speed_factor, physics_step)
+    render_theta = previous_theta + ((theta - previous_theta) % (2 * math.pi)) * alpha
     
     # Draw engine components
-    crank_x, crank_y = draw_crankshaft(theta)
+    crank_x, crank_y = draw_crankshaft(render_theta)
     draw_piston(crank_x, crank_y)
     draw_cylinder_head()
     